@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional per-entry time to live.
+
+    ``maxsize`` bounds the summed ``sizeof(value)`` of all entries; with
+    the default ``sizeof`` every entry weighs 1, so it is an entry count.
+    """
+    def __init__(self, maxsize: int, ttl: Optional[float] = None,
+                 sizeof: Optional[Callable] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.sizeof = sizeof or (lambda value: 1)
+        self._data = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl is not None \
+               and entry[2] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+        if size > self.maxsize:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, size, expires)
+            self._size += size
+            while self._size > self.maxsize:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def discard_where(self, predicate: Callable):
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self._size -= size
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "size": self._size,
+                "max_size": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
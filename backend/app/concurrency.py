@@ -0,0 +1,61 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import anyio
+from anyio import to_thread
+
+from config import BLOCKING_WORKERS, EXPORT_WORKERS, JOB_WORKERS
+
+_limiter = None
+_export_executor = None
+_export_lock = threading.Lock()
+_job_executor = None
+_job_lock = threading.Lock()
+
+def get_limiter() -> anyio.CapacityLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = anyio.CapacityLimiter(BLOCKING_WORKERS)
+    return _limiter
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call (psycopg2, bcrypt) off the event loop.
+
+    Calls share one bounded set of worker threads, sized to the database
+    pool so that offloaded work never waits on a connection it can't get.
+    """
+    return await to_thread.run_sync(partial(func, *args, **kwargs),
+                                    limiter=get_limiter())
+
+def get_export_executor() -> ThreadPoolExecutor:
+    """Worker threads that rebuild pages for document exports."""
+    global _export_executor
+    if _export_executor is None:
+        with _export_lock:
+            if _export_executor is None:
+                _export_executor = ThreadPoolExecutor(
+                    max_workers=EXPORT_WORKERS,
+                    thread_name_prefix="export",
+                )
+    return _export_executor
+
+def get_job_executor() -> ThreadPoolExecutor:
+    """Worker threads for background jobs (see ``jobs.py``)."""
+    global _job_executor
+    if _job_executor is None:
+        with _job_lock:
+            if _job_executor is None:
+                _job_executor = ThreadPoolExecutor(
+                    max_workers=JOB_WORKERS,
+                    thread_name_prefix="job",
+                )
+    return _job_executor
+
+def shutdown_job_executor():
+    """Wait for running jobs; jobs that haven't started are dropped."""
+    global _job_executor
+    with _job_lock:
+        if _job_executor is not None:
+            _job_executor.shutdown(wait=True, cancel_futures=True)
+            _job_executor = None
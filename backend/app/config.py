@@ -8,4 +8,64 @@ DB_NAME = os.getenv("DB_NAME", "gidok")
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
 SECRET_KEY = os.urandom(32).hex()
-ALGORITHM = "HS256"
\ No newline at end of file
+ALGORITHM = "HS256"
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+DB_POOL_RECYCLE = float(os.getenv("DB_POOL_RECYCLE", "300"))
+
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", str(DB_POOL_MAX)))
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+# Migrations run DDL, which DB_USER (app) isn't granted. They default to
+# the dev role of sql/init.sql, which has CREATE on the schema; set these
+# where dev has been revoked or renamed.
+MIGRATE_DB_USER = os.getenv("MIGRATE_DB_USER", "dev")
+MIGRATE_DB_PASSWORD = os.getenv("MIGRATE_DB_PASSWORD", "yourDevPassword")
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "0") == "1"
+
+# Save a full page snapshot every N commits walked while replaying a page
+# (0 disables checkpoints).
+PAGE_CHECKPOINT_INTERVAL = int(os.getenv("PAGE_CHECKPOINT_INTERVAL", "50"))
+
+PAGE_CACHE_BYTES = int(os.getenv("PAGE_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+# Page diffs between non-local commits kept for GET /commit/{id}/diff
+DIFF_CACHE_SIZE = int(os.getenv("DIFF_CACHE_SIZE", "1024"))
+
+# Storage format for newly materialized pages: none, zlib or zstd (zstd
+# needs the zstandard package). Stored pages are read in whatever format
+# they were written with, so this can be changed at any time.
+PAGE_COMPRESSION = os.getenv("PAGE_COMPRESSION", "none")
+PAGE_COMPRESSION_LEVEL = int(os.getenv("PAGE_COMPRESSION_LEVEL", "3"))
+
+# Threads rebuilding pages in parallel for GET /project/{id}/export
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "4"))
+
+# Background jobs (e.g. materializing a release after promote) and how many
+# finished jobs GET /status/jobs remembers.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "100"))
+
+# Materialize every page of the new release tip when promoting, unless the
+# promote request says otherwise.
+PROMOTE_MATERIALIZE = os.getenv("PROMOTE_MATERIALIZE", "0") == "1"
+
+# Per-route latency and SQL statement histograms, served at GET /metrics
+# to requests carrying ADMIN_TOKEN (scrapers send it as X-Admin-Token)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Statements slower than SLOW_QUERY_MS are kept in a ring buffer of
+# SLOW_QUERY_LOG_SIZE entries (0 turns the log off); a sampled fraction of
+# the SELECT/WITH ones is re-run under EXPLAIN (ANALYZE, BUFFERS).
+# Parameters are logged as their types only unless SLOW_QUERY_REDACT=0.
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+SLOW_QUERY_EXPLAIN_SAMPLE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE", "0.1"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "100"))
+SLOW_QUERY_REDACT = os.getenv("SLOW_QUERY_REDACT", "1") == "1"
+
+# Sent as X-Admin-Token to use the /status routes; unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
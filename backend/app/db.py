@@ -1,12 +1,213 @@
+import threading
+import time
+from collections import deque
+
 import psycopg2
-from psycopg2.extras import DictCursor
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.pool import PoolError
+
+from metrics import CountingCursor
+from config import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT, \
+                   DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
+
+
+class PoolTimeoutError(PoolError):
+    pass
+
+
+class ConnectionPool:
+    """Thread-safe pool of psycopg2 connections.
+
+    Checkout blocks for at most ``timeout`` seconds when all ``maxconn``
+    connections are in use. Connections that sat idle longer than
+    ``recycle`` seconds are pinged before being handed out and replaced
+    if the server dropped them.
+    """
+    def __init__(self, minconn: int, maxconn: int,
+                 timeout: float, recycle: float):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.recycle = recycle
+        self._idle = deque()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._counters = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "created": 0,
+            "discarded": 0,
+            "wait_seconds": 0.0,
+        }
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(dbname=DB_NAME,
+                                user=DB_USER,
+                                password=DB_PASSWORD,
+                                host=DB_HOST,
+                                port=DB_PORT,
+                                cursor_factory=CountingCursor)
+        with self._cond:
+            self._counters["created"] += 1
+        return conn
+
+    @staticmethod
+    def _is_alive(conn) -> bool:
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _close(self, conn):
+        """Close a connection leaving the pool. Its slot stays counted in
+        ``_size``."""
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._counters["discarded"] += 1
+
+    def _discard(self, conn):
+        self._close(conn)
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def getconn(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError("connection pool is closed")
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1
+                    conn, released_at = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters["timeouts"] += 1
+                    raise PoolTimeoutError(
+                        f"no connection available within {self.timeout}s"
+                    )
+                self._cond.wait(remaining)
+            self._counters["checkouts"] += 1
+            self._counters["wait_seconds"] += time.monotonic() - started
+
+        if conn is not None:
+            stale = time.monotonic() - released_at > self.recycle
+            if conn.closed or (stale and not self._is_alive(conn)):
+                # Reconnect in the same slot, so no waiter can take it
+                # in between and push the pool past maxconn
+                self._close(conn)
+                conn = None
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+        return conn
+
+    def putconn(self, conn):
+        if self._closed or conn.closed:
+            self._discard(conn)
+            return
+        try:
+            if conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                conn.close()
+                self._size -= 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "size": self._size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                **self._counters,
+            }
+
+
+class PooledConnection:
+    """Proxy handed out by ``get_connection``.
+
+    Behaves like a psycopg2 connection, except that ``close()`` returns
+    the underlying connection to the pool instead of closing it.
+    """
+    def __init__(self, pool: ConnectionPool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.putconn(conn)
+
+    def __del__(self):
+        if self.__dict__.get("_conn") is not None:
+            self.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_POOL_MIN, DB_POOL_MAX,
+                                       DB_POOL_TIMEOUT, DB_POOL_RECYCLE)
+    return _pool
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
 
-from config import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT
+def pool_stats():
+    if _pool is None:
+        return None
+    return _pool.stats()
 
 def get_connection():
-    return psycopg2.connect(dbname=DB_NAME, 
-                            user=DB_USER, 
-                            password=DB_PASSWORD,
-                            host=DB_HOST,
-                            port=DB_PORT,
-                            cursor_factory=DictCursor)
+    pool = get_pool()
+    return PooledConnection(pool, pool.getconn())
@@ -0,0 +1,105 @@
+from typing import List, Tuple
+
+Hunk = Tuple[int, int, int, int]
+
+
+def diff_blocks(old: List[str], new: List[str]) -> List[Hunk]:
+    """Blocks that differ between two versions of a page.
+
+    Returns ``(old_start, old_end, new_start, new_end)`` hunks, half-open
+    block ranges like a commit hunk's ``start_block_index``/``end_block_index``:
+    ``old[old_start:old_end]`` was replaced by ``new[new_start:new_end]``.
+    Uses Myers' O((N+M)D) algorithm after trimming the common prefix and
+    suffix, so a small edit to a long page costs little.
+    """
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    old_mid = old[prefix:len(old) - suffix]
+    new_mid = new[prefix:len(new) - suffix]
+
+    # Compare small ints rather than the block strings in the inner loop
+    ids = {}
+    a = [ids.setdefault(block, len(ids)) for block in old_mid]
+    b = [ids.setdefault(block, len(ids)) for block in new_mid]
+
+    hunks = []
+    i = j = 0
+    for x, y in _common(a, b) + [(len(a), len(b))]:
+        if x > i or y > j:
+            hunks.append((prefix + i, prefix + x, prefix + j, prefix + y))
+        i, j = x + 1, y + 1
+    return hunks
+
+
+def apply_hunks(old: List[str], new: List[str],
+                hunks: List[Hunk]) -> List[str]:
+    """``old`` with ``old[old_start:old_end]`` replaced by
+    ``new[new_start:new_end]`` for each hunk, the inverse of
+    ``diff_blocks``. Hunks are in order and don't overlap; the page is
+    rebuilt in one pass however many there are."""
+    blocks = []
+    position = 0
+    for old_start, old_end, new_start, new_end in hunks:
+        blocks.extend(old[position:old_start])
+        blocks.extend(new[new_start:new_end])
+        position = old_end
+    blocks.extend(old[position:])
+    return blocks
+
+
+def _common(a: List[int], b: List[int]) -> List[Tuple[int, int]]:
+    """Index pairs ``(x, y)`` with ``a[x] == b[y]`` along a shortest edit
+    script, in increasing order."""
+    n, m = len(a), len(b)
+    if n == 0 or m == 0:
+        return []
+    offset = n + m
+    v = [0] * (2 * offset + 2)
+    # trace[d] is v for diagonals -d..d as it was before step d
+    trace = []
+    for d in range(offset + 1):
+        trace.append(v[offset - d:offset + d + 1])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, n, m)
+    return []
+
+
+def _backtrack(trace, n: int, m: int) -> List[Tuple[int, int]]:
+    common = []
+    x, y = n, m
+    for d in range(len(trace) - 1, 0, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[k - 1 + d] < v[k + 1 + d]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[prev_k + d]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            common.append((x, y))
+        x, y = prev_x, prev_y
+    while x > 0 and y > 0:
+        x -= 1
+        y -= 1
+        common.append((x, y))
+    common.reverse()
+    return common
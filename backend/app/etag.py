@@ -0,0 +1,91 @@
+import hashlib
+from typing import Optional
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from concurrency import run_blocking
+from models.commit_model import Commit
+
+# Content addressed by an immutable commit hash never changes.
+IMMUTABLE = "private, max-age=31536000, immutable"
+REVALIDATE = "private, no-cache"
+
+def commit_etag(commit, *parts) -> str:
+    """Strong ETag for content read at ``commit``.
+
+    Local commits are rebased whenever another commit is merged, so their
+    tag also covers the base commit and the (shifted) edit ranges.
+    ``commit`` is a ``Commit`` or a ``CommitRef``.
+    """
+    key = [commit.hash]
+    if commit.mode == "local":
+        key.append(commit.parent_id)
+        for page, start, end, *_ in commit.hunks:
+            key += [page, start, end]
+    key += parts
+    return '"' + "-".join(str(part) for part in key) + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304,
+                    headers={"ETag": etag, "Cache-Control": cache_control})
+
+def json_with_etag(content, if_none_match: Optional[str],
+                   headers: Optional[dict] = None) -> Response:
+    """JSON response tagged with a hash of its body and ``headers``, or 304
+    if unchanged."""
+    headers = headers or {}
+    response = JSONResponse(jsonable_encoder(content),
+                            headers={"Cache-Control": REVALIDATE, **headers})
+    digest = hashlib.sha256(response.body)
+    for name in sorted(headers):
+        digest.update(f"\n{name}: {headers[name]}".encode())
+    etag = '"' + digest.hexdigest()[:32] + '"'
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, REVALIDATE)
+    response.headers["ETag"] = etag
+    return response
+
+async def tagged_commit(project, user, if_none_match: Optional[str],
+                        *parts, hash: Optional[str] = None,
+                        mode: Optional[str] = None):
+    """The commit a read at ``hash``, or at the head of ``mode``, is
+    served from, with its ETag, for routes whose body is a function of
+    the commit and ``parts``.
+
+    Returns ``(not_modified, commit, etag, cache_control)``. A
+    revalidation is answered from the commit's ``CommitRef`` alone, as a
+    304 response in ``not_modified`` to return as is. Otherwise the full
+    commit is loaded, and tagged again in case it was rebased since its
+    ref was read. ``etag`` is None when the commit doesn't exist or the
+    user can't see it.
+    """
+    ref = await run_blocking(Commit.get_commit_ref, hash=hash or None,
+                             mode=mode, project=project)
+
+    etag = cache_control = None
+    if ref != None \
+       and not (ref.status == "normal" and ref.user_id != user._id):
+        etag = commit_etag(ref, *parts)
+        if hash and ref.mode != "local":
+            cache_control = IMMUTABLE
+        else:
+            cache_control = REVALIDATE
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, cache_control), None, etag, \
+                   cache_control
+
+    commit = None
+    if ref != None:
+        commit = await run_blocking(Commit.get_commit,
+                                    id=ref._id, project=project)
+    if etag:
+        etag = commit_etag(commit, *parts) if commit != None else None
+    return None, commit, etag, cache_control
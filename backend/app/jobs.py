@@ -0,0 +1,114 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from concurrency import get_job_executor
+from config import JOB_HISTORY
+
+
+class Job:
+    """Progress of one background job, as reported by GET /status/jobs
+    and GET /project/{id}/jobs."""
+    def __init__(self, job_id: int, kind: str, project_id: int):
+        self.id = job_id
+        self.kind = kind
+        self.project_id = project_id
+        self.status = "queued"
+        self.total = None
+        self.done = 0
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def advance(self, count: int = 1):
+        self.done += count
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "project_id": self.project_id,
+            "status": self.status,
+            "total": self.total,
+            "done": self.done,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobRegistry:
+    """Runs jobs on the background workers and remembers the last
+    ``keep`` of them.
+
+    Submitting a job cancels unfinished jobs of the same kind for the same
+    project, whose work the new one supersedes.
+    """
+    def __init__(self, keep: int):
+        self.keep = keep
+        self._jobs = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, project_id: int,
+               func: Callable[[Job], None]) -> Job:
+        """Run ``func(job)``; it sets ``job.total`` and calls
+        ``job.advance()`` as it goes, and should stop once
+        ``job.cancelled``."""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.kind == kind and job.project_id == project_id \
+                   and job.status in ("queued", "running"):
+                    job.cancel()
+            job = Job(next(self._ids), kind, project_id)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.keep:
+                self._jobs.popitem(last=False)
+        get_job_executor().submit(self._run, job, func)
+        return job
+
+    @staticmethod
+    def _run(job: Job, func: Callable[[Job], None]):
+        if job.cancelled:
+            job.status = "cancelled"
+            return
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            func(job)
+            job.status = "cancelled" if job.cancelled else "done"
+        except Exception as e:
+            print(e)
+            job.status = "failed"
+            job.error = getattr(e, "detail", None) or str(e)
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, project_id: Optional[int] = None):
+        with self._lock:
+            return [job for job in self._jobs.values()
+                    if project_id == None or job.project_id == project_id]
+
+    def cancel_all(self):
+        with self._lock:
+            for job in self._jobs.values():
+                job.cancel()
+
+
+jobs = JobRegistry(JOB_HISTORY)
@@ -1,8 +1,29 @@
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from routes import login, project, commit
+from fastapi.responses import JSONResponse, PlainTextResponse
+from routes import login, project, commit, status as status_route
+from config import DB_MIGRATE_ON_STARTUP, METRICS_ENABLED
+from db import PoolTimeoutError, close_pool
+from concurrency import shutdown_job_executor
+from jobs import jobs
+from metrics import observe_request, render_metrics, route_label, \
+                    start_request
+from middlewares.admin_token import require_admin_token
+from migrate import apply_migrations
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if DB_MIGRATE_ON_STARTUP:
+        apply_migrations()
+    yield
+    jobs.cancel_all()
+    shutdown_job_executor()
+    close_pool()
 
-app = FastAPI(root_path="/api")
+app = FastAPI(root_path="/api", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -10,8 +31,42 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 app.include_router(login.router, prefix="/user")
 app.include_router(project.router, prefix="/project")
-app.include_router(commit.router, prefix="/commit")
\ No newline at end of file
+app.include_router(commit.router, prefix="/commit")
+app.include_router(status_route.router, prefix="/status")
+
+@app.exception_handler(PoolTimeoutError)
+def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "서버가 혼잡합니다. 잠시 후 다시 시도해 주세요."},
+    )
+
+if METRICS_ENABLED:
+    @app.middleware("http")
+    async def record_metrics(request: Request, call_next):
+        stats = start_request(f"{request.method} {request.url.path}")
+        started = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            observe_request(request.method,
+                            route_label(request.scope),
+                            status_code,
+                            time.perf_counter() - started,
+                            stats)
+
+    @app.get("/metrics", include_in_schema=False,
+             dependencies=[Depends(require_admin_token)])
+    def get_metrics():
+        return PlainTextResponse(
+            render_metrics(),
+            media_type="text/plain; version=0.0.4; charset=utf-8",
+        )
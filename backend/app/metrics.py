@@ -0,0 +1,229 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from psycopg2.extras import DictCursor
+
+from slow_queries import slow_queries
+
+
+class RequestStats:
+    """Database work done while serving one request."""
+    __slots__ = ("route", "queries", "db_seconds", "rows")
+
+    def __init__(self, route: Optional[str] = None):
+        self.route = route
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar(
+    "request_stats", default=None
+)
+
+
+def start_request(route: Optional[str] = None) -> RequestStats:
+    """Count the queries of the current request from here on.
+
+    The stats object is shared with the worker threads the request's
+    blocking calls run on, since they run in a copy of this context.
+    """
+    stats = RequestStats(route)
+    _request_stats.set(stats)
+    return stats
+
+
+class CountingCursor(DictCursor):
+    """DictCursor that adds each statement's time and row count to the
+    stats of the request it runs for, if any, and hands statements over
+    the slow-query threshold to the slow-query log."""
+    def execute(self, query, vars=None):
+        stats = _request_stats.get()
+        if stats is None and not slow_queries.enabled:
+            return super().execute(query, vars)
+        started = time.perf_counter()
+        failed = True
+        try:
+            super().execute(query, vars)
+            failed = False
+        finally:
+            seconds = time.perf_counter() - started
+            if stats is not None:
+                stats.queries += 1
+                stats.db_seconds += seconds
+                if self.description is not None and self.rowcount > 0:
+                    stats.rows += self.rowcount
+        if not failed and slow_queries.enabled \
+           and seconds >= slow_queries.threshold:
+            slow_queries.record(self, query, vars, seconds,
+                                stats.route if stats is not None else None)
+
+    def executemany(self, query, vars_list):
+        stats = _request_stats.get()
+        if stats is None:
+            return super().executemany(query, vars_list)
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            stats.queries += 1
+            stats.db_seconds += time.perf_counter() - started
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram with one series per label
+    tuple."""
+    def __init__(self, name: str, help: str, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = \
+                    [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}",
+                 f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, [list(counts), total, count])
+                            for labels, (counts, total, count)
+                            in self._series.items())
+        for labels, (counts, total, count) in series:
+            pairs = [f'{key}="{_escape(value)}"'
+                     for key, value in zip(self.labels, labels)]
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                bucket_pairs = ",".join(pairs + [f'le="{le}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_pairs}}}"
+                             f" {cumulative}")
+            suffix = f"{{{','.join(pairs)}}}" if pairs else ""
+            lines.append(f"{self.name}_sum{suffix} {_number(total)}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}",
+                 f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            pairs = ",".join(f'{key}="{_escape(label)}"'
+                             for key, label in zip(self.labels, labels))
+            lines.append(f"{self.name}{{{pairs}}} {_number(value)}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"') \
+                     .replace("\n", "\\n")
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+ROUTE_LABELS = ("method", "route")
+
+requests_total = Counter(
+    "gidok_requests_total",
+    "Requests served, by route and status code.",
+    ROUTE_LABELS + ("status",),
+)
+request_seconds = Histogram(
+    "gidok_request_duration_seconds",
+    "Wall time until the response headers were sent.",
+    ROUTE_LABELS,
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+request_queries = Histogram(
+    "gidok_request_db_queries",
+    "SQL statements executed per request.",
+    ROUTE_LABELS,
+    (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+request_db_seconds = Histogram(
+    "gidok_request_db_seconds",
+    "Time spent executing SQL per request.",
+    ROUTE_LABELS,
+    (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+request_rows = Histogram(
+    "gidok_request_db_rows",
+    "Rows returned by SQL statements per request.",
+    ROUTE_LABELS,
+    (0, 1, 10, 100, 1000, 10000, 100000),
+)
+
+_metrics = [requests_total, request_seconds, request_queries,
+            request_db_seconds, request_rows]
+
+
+def route_label(scope) -> str:
+    """Route template of the request, e.g. ``/project/{project_id}``, so
+    that ids don't each become a series.
+
+    Depending on the FastAPI version, the matched route's path may or may
+    not include its router's prefix; the prefix is whatever part of the
+    request path the route's own template doesn't account for.
+    """
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    template = getattr(route, "path_format", None) or route.path
+    try:
+        rendered = template.format(**{
+            key: str(value)
+            for key, value in scope.get("path_params", {}).items()
+        })
+    except (KeyError, IndexError, ValueError):
+        return template
+    path = scope.get("path", "")
+    if rendered and path.endswith(rendered):
+        return path[:len(path) - len(rendered)] + template
+    return template
+
+
+def observe_request(method: str, route: str, status: int,
+                    seconds: float, stats: RequestStats):
+    labels = (method, route)
+    requests_total.inc(labels + (str(status),))
+    request_seconds.observe(labels, seconds)
+    request_queries.observe(labels, stats.queries)
+    request_db_seconds.observe(labels, stats.db_seconds)
+    request_rows.observe(labels, stats.rows)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,20 @@
+import hmac
+from typing import Optional
+
+from fastapi import Header, HTTPException
+from starlette import status
+
+from config import ADMIN_TOKEN
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="관리자 기능이 비활성화되어 있습니다.",
+        )
+    if not x_admin_token or not hmac.compare_digest(x_admin_token,
+                                                    ADMIN_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="관리자 토큰이 올바르지 않습니다.",
+        )
@@ -30,7 +30,7 @@ def get_current_user(
         print(e)
         return None
     else:
-        user = UserService.get_user(user_id)
+        user = UserService.get_cached_user(user_id)
         
         if not user:
             return None
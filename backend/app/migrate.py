@@ -0,0 +1,115 @@
+"""Forward-only schema migrations.
+
+Migrations are the ``NNNN_name.sql`` files in ``migrations/``, applied in
+version order, each in its own transaction, and recorded in the
+``schema_migrations`` table.
+
+    python migrate.py            # apply pending migrations
+    python migrate.py --status   # list applied and pending migrations
+"""
+import argparse
+import os
+import re
+
+import psycopg2
+
+from config import DB_NAME, DB_HOST, DB_PORT, \
+                   MIGRATE_DB_USER, MIGRATE_DB_PASSWORD
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              "migrations")
+# Serializes concurrent runners, e.g. several workers starting at once.
+LOCK_KEY = 7_400_131
+
+def list_migrations():
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = re.fullmatch(r"(\d+)_(\w+)\.sql", filename)
+        if match:
+            migrations.append((int(match[1]), match[2],
+                               os.path.join(MIGRATIONS_DIR, filename)))
+    return sorted(migrations)
+
+def connect(user: str = MIGRATE_DB_USER, password: str = MIGRATE_DB_PASSWORD):
+    return psycopg2.connect(dbname=DB_NAME,
+                            user=user,
+                            password=password,
+                            host=DB_HOST,
+                            port=DB_PORT)
+
+def get_applied_versions(cur):
+    cur.execute(
+        """\
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                "version" INTEGER PRIMARY KEY,
+                "name" TEXT NOT NULL,
+                "applied_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """
+    )
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+def apply_migrations(conn=None):
+    should_close = conn is None
+    if should_close:
+        conn = connect()
+    applied = []
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_advisory_lock(%s)", (LOCK_KEY,))
+        try:
+            done = get_applied_versions(cur)
+            conn.commit()
+            for version, name, path in list_migrations():
+                if version in done:
+                    continue
+                with open(path, encoding="utf-8") as f:
+                    cur.execute(f.read())
+                cur.execute(
+                    """\
+                        INSERT INTO schema_migrations (version, name)
+                        VALUES (%s, %s)
+                    """,
+                    (version, name)
+                )
+                conn.commit()
+                applied.append((version, name))
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (LOCK_KEY,))
+            conn.commit()
+    finally:
+        if should_close:
+            conn.close()
+    return applied
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply schema migrations.")
+    parser.add_argument("--status", action="store_true",
+                        help="list migrations without applying them")
+    parser.add_argument("--user", default=MIGRATE_DB_USER)
+    parser.add_argument("--password", default=MIGRATE_DB_PASSWORD)
+    args = parser.parse_args()
+
+    conn = connect(args.user, args.password)
+    try:
+        if args.status:
+            done = get_applied_versions(conn.cursor())
+            conn.commit()
+            for version, name, _ in list_migrations():
+                state = "applied" if version in done else "pending"
+                print(f"{version:04d} {name}: {state}")
+            return
+        applied = apply_migrations(conn)
+    finally:
+        conn.close()
+    for version, name in applied:
+        print(f"applied {version:04d} {name}")
+    if not applied:
+        print("database is up to date")
+
+if __name__ == "__main__":
+    main()
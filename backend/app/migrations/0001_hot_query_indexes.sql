@@ -0,0 +1,49 @@
+-- Primary keys and secondary indexes for the hot query shapes.
+-- Written to be a no-op on databases created from an up-to-date init.sql.
+
+-- blocks: one row per (commit, line). Serves the per-commit block reads
+-- (WHERE commit_id = ... ORDER BY block_index) and the ON DELETE CASCADE
+-- from commits.
+DELETE FROM blocks a
+USING blocks b
+WHERE a.ctid < b.ctid
+  and a.commit_id = b.commit_id
+  and a.block_index = b.block_index;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'blocks'::regclass and contype = 'p'
+    ) THEN
+        ALTER TABLE blocks ADD PRIMARY KEY (commit_id, block_index);
+    END IF;
+END $$;
+
+-- pages: one materialized page per (commit, page). Serves the
+-- (project_id, page_number, commit_id) lookups and the copy/move of a
+-- commit's pages on merge (WHERE commit_id = ...).
+DELETE FROM pages a
+USING pages b
+WHERE a.ctid < b.ctid
+  and a.commit_id = b.commit_id
+  and a.page_number = b.page_number;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'pages'::regclass and contype = 'p'
+    ) THEN
+        ALTER TABLE pages ADD PRIMARY KEY (commit_id, page_number);
+    END IF;
+END $$;
+
+-- commits: hash lookups, tip discovery (NOT EXISTS over children) and the
+-- per-project scans of local commits during merge.
+CREATE INDEX IF NOT EXISTS commits_project_sha256_idx
+    ON commits (project_id, commit_sha256);
+CREATE INDEX IF NOT EXISTS commits_parent_mode_idx
+    ON commits (parent_id, mode);
+CREATE INDEX IF NOT EXISTS commits_project_mode_idx
+    ON commits (project_id, mode);
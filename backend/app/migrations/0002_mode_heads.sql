@@ -0,0 +1,37 @@
+-- Per-project head pointers for the develop and release lines, replacing
+-- the NOT EXISTS anti-join tip discovery over commits.
+--   develop : tip of the develop line (develop and release commits)
+--   release : tip of the release-only line
+CREATE TABLE IF NOT EXISTS mode_heads (
+    "project_id" INTEGER NOT NULL,
+    "mode" project_mode NOT NULL,
+    "commit_id" INTEGER NOT NULL,
+
+    PRIMARY KEY ("project_id", "mode"),
+    FOREIGN KEY ("project_id") REFERENCES "projects"("id") ON DELETE CASCADE,
+    FOREIGN KEY ("commit_id") REFERENCES "commits"("id") ON DELETE CASCADE
+);
+
+INSERT INTO mode_heads (project_id, mode, commit_id)
+SELECT DISTINCT ON (c.project_id) c.project_id, 'develop', c.id
+FROM commits c
+WHERE c.mode IN ('develop', 'release')
+  and NOT EXISTS (
+        SELECT 1 FROM commits child
+        WHERE child.parent_id = c.id
+          and child.mode IN ('develop', 'release')
+    )
+ORDER BY c.project_id, c.id DESC
+ON CONFLICT DO NOTHING;
+
+INSERT INTO mode_heads (project_id, mode, commit_id)
+SELECT DISTINCT ON (c.project_id) c.project_id, 'release', c.id
+FROM commits c
+WHERE c.mode = 'release'
+  and NOT EXISTS (
+        SELECT 1 FROM commits child
+        WHERE child.parent_id = c.id
+          and child.mode = 'release'
+    )
+ORDER BY c.project_id, c.id DESC
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,10 @@
+-- Sort-key indexes for keyset pagination of the search endpoints.
+--   commits  : newest first within a project, (date, id) descending
+--   projects : (name, id)
+--   users    : (name, id)
+CREATE INDEX IF NOT EXISTS commits_project_date_idx
+    ON commits (project_id, date, id);
+CREATE INDEX IF NOT EXISTS projects_name_idx
+    ON projects (name, id);
+CREATE INDEX IF NOT EXISTS users_name_idx
+    ON users (name, id);
@@ -0,0 +1,35 @@
+-- Text search over commit titles and page content.
+
+-- pages.search_vector: tsvector of the page text, written together with the
+-- row whenever a page is materialized. 'simple' keeps every word as-is,
+-- which suits mixed Korean/English documents better than a stemming config.
+ALTER TABLE pages ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+UPDATE pages
+SET search_vector = to_tsvector('simple', content)
+WHERE search_vector IS NULL;
+
+CREATE INDEX IF NOT EXISTS pages_search_vector_idx
+    ON pages USING gin (search_vector);
+
+-- commits.title: trigram index so the title LIKE '%...%' filter of commit
+-- search can use an index. pg_trgm ships with the standard PostgreSQL
+-- contrib packages. Creating it needs CREATE on the database, which the
+-- migration role may not have; then only the index is skipped (the filter
+-- keeps working as a scan) until a superuser runs CREATE EXTENSION pg_trgm
+-- and the index is created by hand.
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')
+       AND EXISTS (
+           SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'
+       )
+       AND has_database_privilege(current_user, current_database(), 'CREATE')
+    THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    END IF;
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        CREATE INDEX IF NOT EXISTS commits_title_trgm_idx
+            ON commits USING gin (title gin_trgm_ops);
+    END IF;
+END $$;
@@ -0,0 +1,30 @@
+-- commits.generation: distance from the project's first commit. Release
+-- and develop commits form one linear history per project, so the
+-- ancestors of a commit are the non-local commits of lower generation and
+-- history walks become range scans over commits_line_generation_idx
+-- instead of recursive parent_id joins.
+ALTER TABLE commits ADD COLUMN IF NOT EXISTS generation INTEGER;
+
+WITH RECURSIVE lineage AS (
+    SELECT id, 0 AS generation
+    FROM commits
+    WHERE parent_id IS NULL
+    UNION ALL
+    SELECT c.id, l.generation + 1
+    FROM commits c
+    JOIN lineage l ON c.parent_id = l.id
+)
+UPDATE commits
+SET generation = lineage.generation
+FROM lineage
+WHERE commits.id = lineage.id
+  and commits.generation IS DISTINCT FROM lineage.generation;
+
+UPDATE commits SET generation = 0 WHERE generation IS NULL;
+
+ALTER TABLE commits ALTER COLUMN generation SET DEFAULT 0;
+ALTER TABLE commits ALTER COLUMN generation SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS commits_line_generation_idx
+    ON commits (project_id, generation)
+    WHERE mode <> 'local';
@@ -0,0 +1,30 @@
+-- Content-addressed block text: each distinct line is stored once in
+-- block_contents, keyed by the sha256 of its UTF-8 bytes, and blocks keep
+-- only the hash. The space freed by dropping blocks.content is reused by
+-- new rows; run VACUUM FULL blocks to return it to the filesystem.
+CREATE TABLE IF NOT EXISTS block_contents (
+    "hash" BYTEA PRIMARY KEY,
+    "content" TEXT NOT NULL
+);
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'blocks' and column_name = 'content'
+    ) THEN
+        ALTER TABLE blocks ADD COLUMN content_hash BYTEA;
+
+        INSERT INTO block_contents (hash, content)
+        SELECT DISTINCT sha256(convert_to(content, 'UTF8')), content
+        FROM blocks
+        ON CONFLICT DO NOTHING;
+
+        UPDATE blocks SET content_hash = sha256(convert_to(content, 'UTF8'));
+
+        ALTER TABLE blocks ALTER COLUMN content_hash SET NOT NULL;
+        ALTER TABLE blocks
+            ADD FOREIGN KEY (content_hash) REFERENCES block_contents (hash);
+        ALTER TABLE blocks DROP COLUMN content;
+    END IF;
+END $$;
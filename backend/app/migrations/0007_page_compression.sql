@@ -0,0 +1,14 @@
+-- Optional compressed storage for materialized pages (PAGE_COMPRESSION).
+-- Rows keep their text in content (content_format 0) or in content_blob
+-- (1 = zlib, 2 = zstd); existing rows stay plain text.
+ALTER TABLE pages ALTER COLUMN content DROP NOT NULL;
+ALTER TABLE pages ADD COLUMN IF NOT EXISTS content_blob BYTEA;
+ALTER TABLE pages ADD COLUMN IF NOT EXISTS content_format SMALLINT NOT NULL DEFAULT 0;
+
+-- The blob is compressed by the application; don't let TOAST try again.
+ALTER TABLE pages ALTER COLUMN content_blob SET STORAGE EXTERNAL;
+
+ALTER TABLE pages DROP CONSTRAINT IF EXISTS pages_content_check;
+ALTER TABLE pages ADD CONSTRAINT pages_content_check
+    CHECK ((content_format = 0) = (content IS NOT NULL)
+           and (content_format = 0) = (content_blob IS NULL));
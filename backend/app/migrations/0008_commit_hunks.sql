@@ -0,0 +1,48 @@
+-- Commits can make several edits, possibly on several pages. Each edit is
+-- a row of commit_hunks: blocks start_block_index..end_block_index of
+-- page_number in the parent's page are replaced by the commit's blocks
+-- block_offset..block_offset + block_count. Hunks are numbered in
+-- (page_number, start_block_index) order and never overlap. Existing
+-- commits made exactly one edit and become one hunk each; the range moves
+-- off commits.
+CREATE TABLE IF NOT EXISTS commit_hunks (
+    "commit_id" INTEGER NOT NULL,
+    "hunk_index" INTEGER NOT NULL,
+    "page_number" INTEGER NOT NULL,
+    "start_block_index" INTEGER NOT NULL,
+    "end_block_index" INTEGER NOT NULL,
+    "block_offset" INTEGER NOT NULL,
+    "block_count" INTEGER NOT NULL,
+
+    PRIMARY KEY ("commit_id", "hunk_index"),
+    FOREIGN KEY ("commit_id") REFERENCES "commits"("id") ON DELETE CASCADE
+);
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'commits' and column_name = 'start_block_index'
+    ) THEN
+        INSERT INTO commit_hunks (
+            commit_id, hunk_index, page_number,
+            start_block_index, end_block_index,
+            block_offset, block_count
+        )
+        SELECT c.id, 0, b.page_number,
+               c.start_block_index, c.end_block_index,
+               0, b.block_count
+        FROM commits c
+        JOIN (
+            SELECT commit_id,
+                   min(page_number) AS page_number,
+                   count(*) AS block_count
+            FROM blocks
+            GROUP BY commit_id
+        ) b ON b.commit_id = c.id
+        ON CONFLICT DO NOTHING;
+
+        ALTER TABLE commits DROP COLUMN start_block_index;
+        ALTER TABLE commits DROP COLUMN end_block_index;
+    END IF;
+END $$;
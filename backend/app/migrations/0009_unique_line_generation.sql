@@ -0,0 +1,11 @@
+-- Release and develop commits are one linear history per project, and
+-- replays and history searches take a commit's ancestors to be the line
+-- commits of lower generation. That only holds while no two line commits
+-- share a generation, so make it a constraint: a merge that would break
+-- it fails instead of silently mixing histories. Replaces the plain
+-- index of 0005, which served the same range scans.
+CREATE UNIQUE INDEX IF NOT EXISTS commits_line_generation_key
+    ON commits (project_id, generation)
+    WHERE mode <> 'local';
+
+DROP INDEX IF EXISTS commits_line_generation_idx;
@@ -0,0 +1,19 @@
+-- commits.description: trigram index for the q filter of commit search,
+-- which matches titles or descriptions with ILIKE '%...%' (title has its
+-- index since 0004). Like there, skipped when pg_trgm isn't installed and
+-- the migrating role can't create it.
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')
+       AND EXISTS (
+           SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'
+       )
+       AND has_database_privilege(current_user, current_database(), 'CREATE')
+    THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    END IF;
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        CREATE INDEX IF NOT EXISTS commits_description_trgm_idx
+            ON commits USING gin (description gin_trgm_ops);
+    END IF;
+END $$;
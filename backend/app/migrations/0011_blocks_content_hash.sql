@@ -0,0 +1,5 @@
+-- Reclaiming block_contents rows looks for blocks that still reference
+-- a hash, and deleting one makes the foreign key do the same check;
+-- without an index on content_hash both scan every block.
+CREATE INDEX IF NOT EXISTS blocks_content_hash_idx
+    ON blocks (content_hash);
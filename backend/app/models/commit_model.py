@@ -3,25 +3,57 @@ from datetime import datetime, timezone, date
 
 from fastapi import HTTPException, status
 from psycopg2.extensions import cursor
+from psycopg2.extras import execute_values
 from pydantic import BaseModel
-from typing import Optional, TYPE_CHECKING
+from typing import List, Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from models.project_model import ProjectService
 from models.user_model import UserModel, UserService
 from db import get_connection
+from pagination import decode_cursor, encode_cursor
+from rebase import LocalIntervals
 
-class CommitCreateForm(BaseModel):
+# Rows per INSERT statement when writing a commit's blocks.
+BLOCK_INSERT_PAGE_SIZE = 1000
+
+class HunkForm(BaseModel):
+    page: int
     old_start: int
     old_end: int
-    page: int
     docs: str
+
+class CommitCreateForm(BaseModel):
+    old_start: Optional[int] = None
+    old_end: Optional[int] = None
+    page: Optional[int] = None
+    docs: Optional[str] = None
+    # Several non-overlapping edits, possibly on different pages, in place
+    # of old_start/old_end/page/docs
+    hunks: Optional[List[HunkForm]] = None
     title: Optional[str] = None
     desc: Optional[str] = None
 
 class CommitPatchForm(BaseModel):
     hash: str
     cmd: str
+    # promote only: materialize the new release in the background;
+    # defaults to PROMOTE_MATERIALIZE
+    materialize: Optional[bool] = None
+
+
+class CommitRef:
+    """What a commit's ETag and visibility depend on, without its blocks
+    or author; see ``Commit.get_commit_ref``. ``hunks`` holds ``(page,
+    start, end)`` for local commits and is empty otherwise."""
+    def __init__(self, row):
+        self._id = row["id"]
+        self.hash = row["commit_sha256"]
+        self.mode = row["mode"]
+        self.status = row["status"]
+        self.user_id = row["user_id"]
+        self.parent_id = row["parent_id"]
+        self.hunks = [tuple(hunk) for hunk in row["hunks"] or []]
 
 
 class Commit:
@@ -30,39 +62,96 @@ class Commit:
         
         self.project = project
         self.user = user
-        self.blocks = form.docs.split("\n")
         self.title = form.title
         self.desc = form.desc
-        self.page = form.page
-        self.old_start = form.old_start
-        self.old_end = form.old_end
         self.mode = "local"
         self.status = "normal"
+
+        hunk_forms = Commit._hunk_forms(form)
+        self.blocks = []
+        self.hunks = []
+        for hunk in hunk_forms:
+            blocks = hunk.docs.split("\n")
+            self.hunks.append((hunk.page, hunk.old_start, hunk.old_end,
+                               len(self.blocks), len(blocks)))
+            self.blocks += blocks
         hash_source = "\n".join([
             str(self.project.project._id),
             str(self.user._id),
             form.title or "",
             form.desc or "",
-            f"{form.old_start}-{form.old_end}-{form.page}",
-            form.docs,
+            *(f"{hunk.old_start}-{hunk.old_end}-{hunk.page}\n{hunk.docs}"
+              for hunk in hunk_forms),
             str(datetime.now(timezone.utc))
         ])
 
         self.hash = hashlib.sha256(hash_source.encode()).hexdigest()
 
+    @staticmethod
+    def _hunk_forms(form: CommitCreateForm) -> List[HunkForm]:
+        """The form's edits, sorted by page and start, after checking that
+        they don't overlap."""
+        if form.hunks:
+            hunks = sorted(form.hunks,
+                           key=lambda hunk: (hunk.page, hunk.old_start))
+        elif None not in (form.page, form.old_start, form.old_end, form.docs):
+            hunks = [HunkForm(page=form.page, old_start=form.old_start,
+                              old_end=form.old_end, docs=form.docs)]
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="page, old_start, old_end, docs 또는 hunks가 필요합니다.",
+            )
+
+        previous = None
+        for hunk in hunks:
+            if hunk.page <= 0:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="페이지 값은 1 이상이어야 합니다.",
+                )
+            if hunk.old_start < 0 or hunk.old_end < hunk.old_start:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="old_start는 0 이상, old_end 이하여야 합니다.",
+                )
+            # Distinct starts too, so two insertions at one place can't
+            # come in either order
+            if previous and previous.page == hunk.page \
+               and (previous.old_end > hunk.old_start
+                    or previous.old_start == hunk.old_start):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="같은 페이지의 수정 범위가 겹칩니다.",
+                )
+            previous = hunk
+        return hunks
+
+    @property
+    def page(self) -> int:
+        """First page the commit edits."""
+        return self.hunks[0][0]
+
+    @property
+    def pages(self) -> List[int]:
+        return sorted({hunk[0] for hunk in self.hunks})
+
+    def page_hunks(self, page: int):
+        """The edits to ``page`` as ``(old_start, old_end, new_start,
+        new_end)``, ``new_*`` indexing ``self.blocks``."""
+        return [(start, end, offset, offset + count)
+                for hunk_page, start, end, offset, count in self.hunks
+                if hunk_page == page]
+
     def create_commit(self):
         def _get_parent_commit(cursor: cursor):
             cursor.execute(
                 """\
-                    SELECT c.id, c.max_page_number FROM commits c
-                    WHERE (mode = 'develop' or mode = 'release')
-                      and project_id = %s
-                      and NOT EXISTS (
-                            SELECT 1 FROM commits child
-                            WHERE child.parent_id = c.id
-                              and (mode = 'develop' or mode = 'release')
-                        )
-                    LIMIT 1
+                    SELECT c.id, c.max_page_number, c.generation
+                    FROM mode_heads h
+                    JOIN commits c ON c.id = h.commit_id
+                    WHERE h.project_id = %s
+                      and h.mode = 'develop'
                 """,
                 (self.project.project._id,)
             )
@@ -72,15 +161,18 @@ class Commit:
         try:
             cur = conn.cursor()
             
+            Commit._lock_project(self.project, cur, "FOR SHARE")
             parent = _get_parent_commit(cur)
-            if parent == None and self.page == 1:
+            last_page = self.pages[-1]
+            if parent == None and last_page == 1:
                 self.parent_id = None
-                self.max_page = 1,
+                self.max_page = 1
+                self.generation = 0
                 parent_max_page = None
-            elif (parent and parent["max_page_number"] + 1 >= self.page 
-                  and self.page > 0):
+            elif parent and parent["max_page_number"] + 1 >= last_page:
                 self.parent_id = parent["id"]
-                self.max_page = max(parent["max_page_number"], self.page)
+                self.max_page = max(parent["max_page_number"], last_page)
+                self.generation = parent["generation"] + 1
                 parent_max_page = parent["max_page_number"]
             else:
                 raise HTTPException(
@@ -95,8 +187,7 @@ class Commit:
                       self.title,
                       self.desc,
                       self.max_page,
-                      self.old_start,
-                      self.old_end]
+                      self.generation]
             cur.execute(
                 """\
                 INSERT INTO commits (
@@ -107,21 +198,36 @@ class Commit:
                     title,
                     description,
                     max_page_number,
-                    start_block_index,
-                    end_block_index)
+                    generation)
                 VALUES (
                     %s, %s, %s, %s,
-                    %s, %s, %s, %s, %s
+                    %s, %s, %s, %s
                 )
                 RETURNING id, date
                 """,
                 params
             )
             self._id, self.date = cur.fetchone()
-            for i, block in enumerate(self.blocks):
-                self._insert_block(block, i, cur)
+            self._insert_blocks(cur)
+            execute_values(
+                cur,
+                """\
+                INSERT INTO commit_hunks (
+                    commit_id,
+                    hunk_index,
+                    page_number,
+                    start_block_index,
+                    end_block_index,
+                    block_offset,
+                    block_count
+                )
+                VALUES %s
+                """,
+                [(self._id, index, *hunk)
+                 for index, hunk in enumerate(self.hunks)]
+            )
                 
-            self.project.insert_page(self.page, self, parent_max_page,cur)
+            self.project.insert_pages(self, parent_max_page, cur)
             conn.commit()
         except HTTPException as e:
             conn.rollback()
@@ -137,24 +243,57 @@ class Commit:
             conn.close()
         return self.hash
     
-    def _insert_block(self, block: str, index: int, cursor: cursor):
+    def _insert_blocks(self, cursor: cursor):
+        """Write the commit's blocks, storing only text not seen before.
+
+        Block text lives once in ``block_contents`` under its sha256;
+        ``blocks`` rows reference it by hash. Text that is already stored
+        is locked ``FOR KEY SHARE``, so that ``reclaim_block_contents``
+        leaves it alone until this commit's blocks reference it.
+        """
+        hashes = [hashlib.sha256(block.encode()).digest()
+                  for block in self.blocks]
+        new_contents = dict(zip(hashes, self.blocks))
         cursor.execute(
+            """\
+            SELECT hash FROM block_contents
+            WHERE hash = ANY(%s)
+            FOR KEY SHARE
+            """,
+            (list(new_contents),)
+        )
+        for (known,) in cursor.fetchall():
+            new_contents.pop(bytes(known), None)
+
+        if new_contents:
+            execute_values(
+                cursor,
+                """\
+                INSERT INTO block_contents (hash, content)
+                VALUES %s
+                ON CONFLICT DO NOTHING
+                """,
+                list(new_contents.items()),
+                page_size=BLOCK_INSERT_PAGE_SIZE
+            )
+        pages = [page for page, _, _, _, count in self.hunks
+                 for _ in range(count)]
+        execute_values(
+            cursor,
             """\
             INSERT INTO blocks (
                 project_id,
                 page_number,
                 block_index,
-                content,
+                content_hash,
                 commit_id
             )
-            VALUES (%s, %s, %s, %s, %s)
+            VALUES %s
             """,
-            (self.project.project._id,
-             self.page,
-             index,
-             block,
-             self._id
-             )
+            [(self.project.project._id, page, index, content_hash,
+              self._id)
+             for index, (page, content_hash) in enumerate(zip(pages, hashes))],
+            page_size=BLOCK_INSERT_PAGE_SIZE
         )
 
     @classmethod
@@ -162,7 +301,12 @@ class Commit:
                    mode: Optional[str] = None,
                    hash: Optional[str] = None,
                    id: Optional[int] = None,
-                   cursor: Optional[cursor] = None):
+                   cursor: Optional[cursor] = None,
+                   for_update: bool = False):
+        """``for_update`` locks the commit's row, for the caller's
+        transaction on ``cursor``."""
+        lock = "FOR UPDATE" if for_update else ""
+
         def from_row(row, cur) -> "Commit":
             commit: Commit = cls.__new__(cls)
             commit.project = project
@@ -174,11 +318,10 @@ class Commit:
             commit.mode = row["mode"]
             commit.status = row["status"]
             commit.parent_id = row["parent_id"]
-            commit.old_start = row["start_block_index"]
-            commit.old_end = row["end_block_index"]
             commit.date = row["date"]
             commit.max_page = row["max_page_number"]
-            commit.blocks, commit.page = Commit.get_blocks_and_page_number(commit, cur)
+            commit.generation = row["generation"]
+            commit.blocks, commit.hunks = Commit.get_blocks_and_hunks(commit, cur)
             
             return commit
          
@@ -194,9 +337,10 @@ class Commit:
             commit_data = None
             if id != None:
                 cur.execute(
-                    """\
+                    f"""\
                         SELECT * FROM commits
                         WHERE id = %s
+                        {lock}
                     """,
                     (id,)
                 )
@@ -205,10 +349,11 @@ class Commit:
                     return None
             elif hash != None:
                 cur.execute(
-                    """\
+                    f"""\
                     SELECT * From commits
                     WHERE commit_sha256 = %s
                       and project_id = %s
+                    {lock}
                     """,
                     (hash, project.project._id)
                 )
@@ -217,18 +362,14 @@ class Commit:
                     return None
             elif mode == "release" or mode == "develop":
                 cur.execute(
-                    """\
-                        SELECT * FROM commits c
-                        WHERE (c.mode = %s or c.mode = 'release')
-                          and project_id = %s
-                          and NOT EXISTS (
-                                SELECT 1 FROM commits child
-                                WHERE child.parent_id = c.id
-                                  and (child.mode = %s or child.mode = 'release')
-                            )
-                        LIMIT 1
+                    f"""\
+                        SELECT c.* FROM mode_heads h
+                        JOIN commits c ON c.id = h.commit_id
+                        WHERE h.project_id = %s
+                          and h.mode = %s
+                        {lock}
                     """,
-                    (mode, project.project._id, mode)
+                    (project.project._id, mode)
                 )
                 commit_data = cur.fetchone()
                 if commit_data == None:
@@ -248,22 +389,97 @@ class Commit:
                 conn.close()
 
     @staticmethod
-    def get_blocks_and_page_number(commit: "Commit", cursor: cursor):
+    def get_commit_ref(*, project: "ProjectService",
+                       mode: Optional[str] = None,
+                       hash: Optional[str] = None) -> Optional[CommitRef]:
+        """The commit at ``hash``, or the head of ``mode``, as a
+        ``CommitRef``, in a single query."""
+        if hash != None:
+            source = """\
+                    FROM commits c
+                    WHERE c.commit_sha256 = %s
+                      and c.project_id = %s"""
+            params = (hash, project.project._id)
+        elif mode == "release" or mode == "develop":
+            source = """\
+                    FROM mode_heads m
+                    JOIN commits c ON c.id = m.commit_id
+                    WHERE m.project_id = %s
+                      and m.mode = %s"""
+            params = (project.project._id, mode)
+        else:
+            return None
+
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                f"""\
+                    SELECT c.id, c.commit_sha256, c.mode, c.status,
+                           c.user_id, c.parent_id,
+                           CASE WHEN c.mode = 'local' THEN ARRAY(
+                               SELECT ARRAY[h.page_number,
+                                            h.start_block_index,
+                                            h.end_block_index]
+                               FROM commit_hunks h
+                               WHERE h.commit_id = c.id
+                               ORDER BY h.hunk_index
+                           ) END AS hunks
+                    {source}
+                """,
+                params
+            )
+            row = cur.fetchone()
+            return CommitRef(row) if row else None
+        except Exception as e:
+            print(e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="서버 에러",
+            )
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_blocks_and_hunks(commit: "Commit", cursor: cursor):
         cursor.execute(
             """\
-                SELECT content, page_number FROM blocks
-                WHERE project_id = %s
-                  and commit_id = %s
-                ORDER BY block_index ASC
+                SELECT bc.content FROM blocks b
+                JOIN block_contents bc ON bc.hash = b.content_hash
+                WHERE b.project_id = %s
+                  and b.commit_id = %s
+                ORDER BY b.block_index ASC
             """,
             (commit.project.project._id, commit._id)
         )
-        rows = cursor.fetchall()
-        
-        blocks = [row[0] for row in rows]
+        blocks = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            """\
+                SELECT page_number, start_block_index, end_block_index,
+                       block_offset, block_count
+                FROM commit_hunks
+                WHERE commit_id = %s
+                ORDER BY hunk_index ASC
+            """,
+            (commit._id,)
+        )
+        hunks = [tuple(row) for row in cursor.fetchall()]
 
-        return blocks, rows[0][1]
+        return blocks, hunks
     
+    @staticmethod
+    def _set_head(project: "ProjectService", mode: str, commit_id: int,
+                  cursor: cursor):
+        cursor.execute(
+            """\
+                INSERT INTO mode_heads (project_id, mode, commit_id)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (project_id, mode)
+                DO UPDATE SET commit_id = EXCLUDED.commit_id
+            """,
+            (project.project._id, mode, commit_id)
+        )
+
     @staticmethod
     def push_commit(hash: str, project: "ProjectService", user: UserModel):
         conn = get_connection()
@@ -304,7 +520,11 @@ class Commit:
         conn = get_connection()
         try:
             cur = conn.cursor()
-            commit: Commit = Commit.get_commit(hash=hash,project=project,cursor=cur)
+            Commit._lock_project(project, cur, "FOR NO KEY UPDATE")
+            # Read only once locked: an earlier merge may have merged this
+            # commit already, or rebased it
+            commit: Commit = Commit.get_commit(hash=hash, project=project,
+                                               cursor=cur, for_update=True)
             if not commit or commit.mode != "local" or commit.status != "push":
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -320,48 +540,13 @@ class Commit:
                 """,
                 (commit._id, )
             )
-            cur.execute(
-                """\
-                    DELETE FROM commits
-                    WHERE project_id = %s
-                      and mode = 'local'
-                      and ((start_block_index < %s and end_block_index > %s)
-                        or (start_block_index < %s and end_block_index > %s))
-                """,
-                (project.project._id, 
-                 commit.old_start, 
-                 commit.old_start,
-                 commit.old_end,
-                 commit.old_end)
-            )
-            old_len = commit.old_end - commit.old_start
-            new_len = len(commit.blocks)
-            
-            cur.execute(
-                """\
-                    UPDATE commits
-                    SET start_block_index = start_block_index + %s,
-                        end_block_index = end_block_index + %s
-                    WHERE %s <= start_block_index
-                      and mode = 'local'
-                      and EXISTS (SELECT * FROM blocks WHERE commit_id = id and page_number = %s)
-                """,
-                (new_len-old_len, new_len-old_len, commit.old_end, commit.page)
-            )
-            
-            cur.execute(
-                """\
-                    UPDATE commits
-                    SET parent_id = %s,
-                        max_page_number = GREATEST(max_page_number, %s)
-                    WHERE project_id = %s
-                      and mode = 'local'
-                """,
-                (commit._id, commit.max_page, project.project._id)
-            )
+            Commit._set_head(project, "develop", commit._id, cur)
+            stale, rebased = Commit._rebase_locals(commit, project, cur)
 
-            project.update_page(commit, cur)
+            rebased.update(project.update_page(commit, cur))
             conn.commit()
+            project.invalidate_pages(stale)
+            project.invalidate_pages(rebased, pages=commit.pages)
         except HTTPException as e:
             raise e
         except Exception as e:
@@ -375,6 +560,138 @@ class Commit:
 
         return commit.hash
         
+    @staticmethod
+    def reclaim_block_contents(cursor: cursor,
+                               hashes: Optional[List[bytes]] = None) -> int:
+        """Delete ``block_contents`` rows no block references any more,
+        among ``hashes`` or everywhere. Returns how many were deleted.
+
+        Rows locked by a commit being created, which is about to reference
+        them (see ``_insert_blocks``), are skipped rather than waited for;
+        a commit that comes after finds the row gone and stores it again.
+        """
+        cursor.execute(
+            """\
+                DELETE FROM block_contents
+                WHERE hash IN (
+                    SELECT bc.hash FROM block_contents bc
+                    WHERE (%s IS NULL or bc.hash = ANY(%s))
+                      and NOT EXISTS (
+                          SELECT 1 FROM blocks b
+                          WHERE b.content_hash = bc.hash
+                      )
+                    FOR UPDATE SKIP LOCKED
+                )
+            """,
+            (hashes, hashes)
+        )
+        return cursor.rowcount
+
+    @staticmethod
+    def _lock_project(project: "ProjectService", cursor: cursor, lock: str):
+        """Lock the project's row until the transaction ends.
+
+        Merges take it ``FOR NO KEY UPDATE``, so that they run one at a
+        time, and commit creation ``FOR SHARE``, so that no commit is
+        based on a develop head that a merge is moving without being
+        rebased by that merge. Neither conflicts with the ``FOR KEY SHARE``
+        lock taken by foreign key checks. The develop head row itself
+        can't serve, as it only exists after the first merge.
+        """
+        cursor.execute(
+            f"""\
+                SELECT 1 FROM projects
+                WHERE id = %s
+                {lock}
+            """,
+            (project.project._id,)
+        )
+
+    @staticmethod
+    def _rebase_locals(commit: "Commit", project: "ProjectService",
+                       cursor: cursor):
+        """Rebase the project's local commits onto the merged ``commit``.
+
+        The hunks of the local commits are loaded once; conflicts and
+        block shifts are worked out per hunk in memory with
+        ``LocalIntervals``. The caller holds the project lock of
+        ``_lock_project``, so no other merge or new commit can change the
+        local commits underneath.
+        Commits with a conflicting hunk are deleted, every other local
+        commit is reparented by one batched UPDATE and the hunks that move
+        are shifted by another. Returns the ids of the deleted and of the
+        rebased commits.
+        """
+        cursor.execute(
+            """\
+                SELECT h.commit_id,
+                       h.hunk_index,
+                       h.page_number,
+                       h.start_block_index,
+                       h.end_block_index
+                FROM commits c
+                JOIN commit_hunks h ON h.commit_id = c.id
+                WHERE c.project_id = %s
+                  and c.mode = 'local'
+            """,
+            (project.project._id,)
+        )
+        local_hunks = cursor.fetchall()
+        intervals = LocalIntervals(local_hunks)
+        stale, shifts = intervals.rebase(
+            (page, start, end, count)
+            for page, start, end, _, count in commit.hunks
+        )
+        if stale:
+            cursor.execute(
+                """\
+                    SELECT DISTINCT content_hash FROM blocks
+                    WHERE commit_id = ANY(%s)
+                """,
+                (list(stale),)
+            )
+            stale_contents = [bytes(row[0]) for row in cursor.fetchall()]
+            cursor.execute(
+                """\
+                    DELETE FROM commits
+                    WHERE id = ANY(%s)
+                """,
+                (list(stale),)
+            )
+            if stale_contents:
+                Commit.reclaim_block_contents(cursor, stale_contents)
+
+        rebased = {row[0] for row in local_hunks} - stale
+        if rebased:
+            cursor.execute(
+                """\
+                    UPDATE commits
+                    SET parent_id = %s,
+                        generation = %s,
+                        max_page_number = GREATEST(max_page_number, %s)
+                    WHERE id = ANY(%s)
+                """,
+                (commit._id, commit.generation + 1, commit.max_page,
+                 list(rebased))
+            )
+        if shifts:
+            keys = list(shifts)
+            cursor.execute(
+                """\
+                    UPDATE commit_hunks h
+                    SET start_block_index = h.start_block_index + v.shift,
+                        end_block_index = h.end_block_index + v.shift
+                    FROM unnest(%s::int[], %s::int[], %s::int[])
+                         AS v(commit_id, hunk_index, shift)
+                    WHERE h.commit_id = v.commit_id
+                      and h.hunk_index = v.hunk_index
+                """,
+                ([commit_id for commit_id, _ in keys],
+                 [hunk_index for _, hunk_index in keys],
+                 [shifts[key] for key in keys])
+            )
+        return stale, rebased
+
     @staticmethod
     def promote_commit(project: "ProjectService"):
         conn = get_connection()
@@ -389,6 +706,18 @@ class Commit:
                 """,
                 (project.project._id,)
             )
+            cur.execute(
+                """\
+                    INSERT INTO mode_heads (project_id, mode, commit_id)
+                    SELECT project_id, 'release', commit_id
+                    FROM mode_heads
+                    WHERE project_id = %s
+                      and mode = 'develop'
+                    ON CONFLICT (project_id, mode)
+                    DO UPDATE SET commit_id = EXCLUDED.commit_id
+                """,
+                (project.project._id,)
+            )
             conn.commit()
         except Exception as e:
             print(e)
@@ -410,7 +739,22 @@ class Commit:
                              start_date: Optional[date],
                              end_date: Optional[date],
                              start: int, 
-                             end:int):
+                             end:int,
+                             after: Optional[str] = None,
+                             q: Optional[str] = None):
+        """Returns ``(rows, next_cursor)``, newest first by (date, id).
+
+        ``q`` matches anywhere in the title or the description, ignoring
+        case; both columns have a trigram index where pg_trgm is
+        installed.
+        """
+        limit = end - start
+        if after:
+            after_date, after_id = decode_cursor(after, datetime, int)
+            start = 0
+        else:
+            after_date = after_id = None
+
         conn = get_connection()
         try:
             cur = conn.cursor()
@@ -425,10 +769,11 @@ class Commit:
                            c.status,
                            c.mode,
                            c.max_page_number,
-                           (SELECT b.page_number FROM blocks b
-                            WHERE b.commit_id = c.id
-                            LIMIT 1),
-                           p.commit_sha256
+                           (SELECT h.page_number FROM commit_hunks h
+                            WHERE h.commit_id = c.id
+                              and h.hunk_index = 0),
+                           p.commit_sha256,
+                           c.id
                     FROM commits c
                     JOIN users u ON u.id = c.user_id
                     LEFT JOIN commits p ON p.id = c.parent_id
@@ -437,7 +782,11 @@ class Commit:
                       and (%s IS NULL or c.status = %s)
                       and (%s IS NULL or c.mode = %s)
                       and (%s IS NULL or c.title LIKE %s)
+                      and (%s IS NULL or c.title ILIKE %s
+                           or c.description ILIKE %s)
                       and (%s IS NULL or c.date BETWEEN %s AND %s)
+                      and (%s IS NULL or (c.date, c.id) < (%s, %s))
+                    ORDER BY c.date DESC, c.id DESC
                     LIMIT %s OFFSET %s
                 """,
                 (project.project._id,
@@ -445,57 +794,79 @@ class Commit:
                  status, status,
                  mode, mode,
                  title, f"%{title}%",
+                 q, f"%{q}%", f"%{q}%",
                  start_date, start_date, end_date,
-                 end-start, start
+                 after_id, after_date, after_id,
+                 limit + 1, start
                  )
             )
             rows = cur.fetchall()
         finally:
             conn.close()
         
-        return rows
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            if rows:
+                next_cursor = encode_cursor(rows[-1][3], rows[-1]["id"])
+        return [row[:-1] for row in rows], next_cursor
         
     @staticmethod
     def search_with_chain(project: "ProjectService",
                           start_hash: Optional[str],
                           mode: Optional[str],
                           start: int,
-                          end: int):
+                          end: int,
+                          after: Optional[str] = None):
+        """Returns ``(rows, next_cursor)``, walking parents from the anchor.
+
+        The ancestors of a commit are the release/develop commits of lower
+        generation, read as one range scan rather than a recursive walk.
+        The cursor names the next commit on the chain, so a follow-up page
+        re-anchors there instead of walking and skipping ``start`` commits.
+        Local mode without a hash has one anchor per local commit and is
+        not given a cursor.
+        """
+        limit = end - start
+        if after:
+            start_hash, = decode_cursor(after, str)
+            mode = None
+            start, end = 0, limit
+        single_chain = start_hash or mode != "local"
+
         conn = get_connection()
         try:
             cur = conn.cursor()
             
             cur.execute(
                 """\
-                    WITH RECURSIVE commit_chain AS (
-                        SELECT curr_commit.*,
-                               curr_parent.commit_sha256 AS parent_sha256, 
-                               0 AS depth
+                    WITH anchor AS (
+                        SELECT curr_commit.*
                         FROM commits curr_commit
-                        LEFT JOIN commits curr_parent 
-                            ON curr_parent.id = curr_commit.parent_id
                         WHERE curr_commit.project_id = %s
                           and (%s IS NULL or curr_commit.commit_sha256 = %s)
-                          and (%s is NULL or (
-                                (curr_commit.mode = %s or curr_commit.mode = 'release')
-                                and NOT EXISTS(
-                                    SELECT 1 FROM commits child
-                                    WHERE child.parent_id = curr_commit.id
-                                    and (child.mode = %s or child.mode = 'release')
+                          and (%s is NULL
+                               or (%s = 'local' and curr_commit.mode = 'local')
+                               or curr_commit.id = (
+                                    SELECT h.commit_id FROM mode_heads h
+                                    WHERE h.project_id = curr_commit.project_id
+                                      and h.mode = %s
                                 ))
-                              )
+                    ),
+                    commit_chain AS (
+                        SELECT anchor.*, 0 AS depth
+                        FROM anchor
                         UNION ALL
 
                         SELECT 
                             prev_commit.*,
-                            prev_parent.commit_sha256 AS parent_sha256, 
-                            chain.depth + 1
-                        FROM commits prev_commit
-                        LEFT JOIN commits prev_parent 
-                            ON prev_parent.id = prev_commit.parent_id
-                        INNER JOIN commit_chain chain
-                            ON chain.parent_id = prev_commit.id
-                        WHERE chain.depth < %s
+                            anchor.generation - prev_commit.generation
+                        FROM anchor
+                        INNER JOIN commits prev_commit
+                            ON prev_commit.project_id = anchor.project_id
+                           and prev_commit.mode <> 'local'
+                           and prev_commit.generation >= anchor.generation - %s
+                           and prev_commit.generation < anchor.generation
                     )
 
                     SELECT 
@@ -508,12 +879,13 @@ class Commit:
                         cc.status,
                         cc.mode,
                         cc.max_page_number,
-                        (SELECT b.page_number FROM blocks b
-                         WHERE b.commit_id = cc.id
-                         LIMIT 1),
-                        cc.parent_sha256
+                        (SELECT h.page_number FROM commit_hunks h
+                         WHERE h.commit_id = cc.id
+                           and h.hunk_index = 0),
+                        parent.commit_sha256
                     FROM commit_chain cc
                     JOIN users u ON u.id = cc.user_id
+                    LEFT JOIN commits parent ON parent.id = cc.parent_id
                     ORDER BY depth ASC
                     OFFSET %s
                 """,
@@ -528,4 +900,9 @@ class Commit:
         finally:
             conn.close()
         
-        return rows
+        next_cursor = None
+        if single_chain and len(rows) > limit:
+            if limit > 0:
+                next_cursor = encode_cursor(rows[limit][0])
+            rows = rows[:limit]
+        return rows, next_cursor
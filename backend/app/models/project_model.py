@@ -1,11 +1,106 @@
+import bisect
+import itertools
+import sys
+import threading
+import zlib
+from collections import deque
+
 from pydantic import BaseModel, PrivateAttr
-from typing import Optional
+from typing import Iterable, Optional
 from fastapi import HTTPException, status
 from models.commit_model import Commit
 from psycopg2.errors import UniqueViolation
 from psycopg2.extensions import cursor
+from psycopg2.extras import execute_values
 from models.user_model import UserModel
+from cache import LRUCache
+from concurrency import get_export_executor
+from config import PAGE_CHECKPOINT_INTERVAL, PAGE_CACHE_BYTES, EXPORT_WORKERS, \
+                   PAGE_COMPRESSION, PAGE_COMPRESSION_LEVEL, DIFF_CACHE_SIZE
 from db import get_connection
+from diff import apply_hunks, diff_blocks
+from jobs import Job, jobs
+from pagination import decode_cursor, encode_cursor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# pages.content_format values
+PAGE_FORMAT_TEXT = 0
+PAGE_FORMAT_ZLIB = 1
+PAGE_FORMAT_ZSTD = 2
+PAGE_FORMATS = {
+    "none": PAGE_FORMAT_TEXT,
+    "zlib": PAGE_FORMAT_ZLIB,
+    "zstd": PAGE_FORMAT_ZSTD,
+}
+
+if PAGE_COMPRESSION not in PAGE_FORMATS:
+    raise ValueError(f"PAGE_COMPRESSION must be one of {', '.join(PAGE_FORMATS)}")
+if PAGE_COMPRESSION == "zstd" and zstandard is None:
+    raise RuntimeError("PAGE_COMPRESSION=zstd needs the zstandard package")
+
+class ReplayStats:
+    """Replay depth (commits walked per page reconstruction) counters,
+    used to tune ``PAGE_CHECKPOINT_INTERVAL``."""
+    BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.replays = 0
+        self.total_depth = 0
+        self.max_depth = 0
+        self.checkpoints = 0
+        self.buckets = [0] * (len(self.BUCKETS) + 1)
+
+    def record(self, depth: int, checkpoints: int):
+        with self._lock:
+            self.replays += 1
+            self.total_depth += depth
+            self.max_depth = max(self.max_depth, depth)
+            self.checkpoints += checkpoints
+            self.buckets[bisect.bisect_left(self.BUCKETS, depth)] += 1
+
+    def stats(self):
+        with self._lock:
+            bounds = [str(bound) for bound in self.BUCKETS] + ["+Inf"]
+            return {
+                "replays": self.replays,
+                "mean_depth": (self.total_depth / self.replays
+                               if self.replays else 0),
+                "max_depth": self.max_depth,
+                "checkpoints_written": self.checkpoints,
+                "checkpoint_interval": PAGE_CHECKPOINT_INTERVAL,
+                "depth_le": dict(zip(bounds, self.buckets)),
+            }
+
+replay_stats = ReplayStats()
+
+# Characters of page text around the first match in a search snippet.
+SNIPPET_CHARS = 160
+
+def make_snippet(content: str, query: str) -> str:
+    """Excerpt of ``content`` around the first word of ``query`` found in it.
+
+    ``query`` is in websearch_to_tsquery syntax; quotes, ``or`` and
+    excluded (``-word``) terms are ignored.
+    """
+    terms = [term.strip('"').lower() for term in query.split()
+             if term.lower() != "or" and not term.startswith("-")]
+    lowered = content.lower()
+    hits = [lowered.find(term) for term in terms if term]
+    hits = [hit for hit in hits if hit >= 0]
+    first = min(hits) if hits else 0
+    begin = max(first - SNIPPET_CHARS // 4, 0)
+    snippet = " ".join(content[begin:begin + SNIPPET_CHARS].split())
+    if begin > 0:
+        snippet = "…" + snippet
+    if begin + SNIPPET_CHARS < len(content):
+        snippet += "…"
+    return snippet
+
 
 class ProjectModel(BaseModel):
     _id: int = PrivateAttr()
@@ -15,9 +110,67 @@ class ProjectModel(BaseModel):
 
 
 class ProjectService:
+    # Page contents keyed by (project_id, page_number, commit_id), bounded
+    # by their total size in bytes.
+    page_cache = LRUCache(PAGE_CACHE_BYTES, sizeof=sys.getsizeof)
+
+    # Format new pages are written in; see PAGE_COMPRESSION.
+    page_format = PAGE_FORMATS[PAGE_COMPRESSION]
+
+    # Diffs between non-local commits, which never change, keyed by
+    # (project_id, old hash, new hash, old page, new page).
+    diff_cache = LRUCache(DIFF_CACHE_SIZE)
+
     def __init__(self, project: ProjectModel):
         self.project = project
 
+    @staticmethod
+    def encode_page(content: str, page_format: Optional[int] = None):
+        """Column values ``(content, content_blob, content_format)`` for
+        storing a page. Pages that don't shrink are kept as plain text."""
+        if page_format == None:
+            page_format = ProjectService.page_format
+        if page_format == PAGE_FORMAT_TEXT:
+            return content, None, PAGE_FORMAT_TEXT
+
+        raw = content.encode()
+        if page_format == PAGE_FORMAT_ZLIB:
+            blob = zlib.compress(raw, PAGE_COMPRESSION_LEVEL)
+        else:
+            blob = zstandard.ZstdCompressor(
+                level=PAGE_COMPRESSION_LEVEL).compress(raw)
+        if len(blob) >= len(raw):
+            return content, None, PAGE_FORMAT_TEXT
+        return None, blob, page_format
+
+    @staticmethod
+    def decode_page(content: Optional[str], content_blob,
+                    content_format: int) -> str:
+        """Page text from the stored ``pages`` columns."""
+        if content_format == PAGE_FORMAT_TEXT:
+            return content
+        if content_format == PAGE_FORMAT_ZLIB:
+            return zlib.decompress(content_blob).decode()
+        if content_format == PAGE_FORMAT_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("reading zstd pages needs the zstandard package")
+            return zstandard.ZstdDecompressor().decompress(
+                bytes(content_blob)).decode()
+        raise ValueError(f"unknown page format {content_format}")
+
+    @staticmethod
+    def invalidate_pages(commit_ids, pages: Optional[Iterable[int]] = None):
+        """Forget cached pages of commits whose content changed, only
+        ``pages`` of them if given."""
+        commit_ids = set(commit_ids)
+        if pages != None:
+            pages = set(pages)
+        if commit_ids:
+            ProjectService.page_cache.discard_where(
+                lambda key: key[2] in commit_ids
+                            and (pages == None or key[1] in pages)
+            )
+
 
     @classmethod
     def create_project(cls, name, org = None, desc = None):
@@ -202,7 +355,21 @@ class ProjectService:
 
     @staticmethod
     def search_project(name: str, start:int, end:int, order: str,
-                       role: Optional[str], userid: Optional[str]):
+                       role: Optional[str], userid: Optional[str],
+                       after: Optional[str] = None):
+        """Returns ``(rows, next_cursor)``, ordered by (name, id).
+
+        Membership is checked with EXISTS so a project with several
+        members is listed once.
+        """
+        limit = end - start
+        if after:
+            after_name, after_id = decode_cursor(after, str, int)
+            start = 0
+        else:
+            after_name = after_id = None
+        op = ">" if order == "ASC" else "<"
+
         conn = get_connection()
         try:
             cur = conn.cursor()
@@ -210,17 +377,22 @@ class ProjectService:
                 f"""\
                     SELECT p.id, p.name, p.organization, p.description
                     FROM projects p
-                    JOIN auth a ON p.id = a.project_id
-                    JOIN users u ON u.id = a.user_id
                     WHERE p.name LIKE %s
-                      and (%s IS NULL or a.role = %s)
-                      and (%s IS NULL or u.userid=%s)
-                    ORDER BY p.name {order}
+                      and EXISTS (
+                            SELECT 1 FROM auth a
+                            JOIN users u ON u.id = a.user_id
+                            WHERE a.project_id = p.id
+                              and (%s IS NULL or a.role = %s)
+                              and (%s IS NULL or u.userid=%s)
+                      )
+                      and (%s IS NULL or (p.name, p.id) {op} (%s, %s))
+                    ORDER BY p.name {order}, p.id {order}
                     LIMIT %s OFFSET %s
                 """,
                 (f"%{name}%", role, role,
                  userid, userid,
-                 end-start, start)
+                 after_id, after_name, after_id,
+                 limit + 1, start)
             )
             projects = cur.fetchall()
             conn.commit()
@@ -232,7 +404,14 @@ class ProjectService:
             )
         finally:
             conn.close()
-        return projects
+
+        next_cursor = None
+        if len(projects) > limit:
+            projects = projects[:limit]
+            if projects:
+                next_cursor = encode_cursor(projects[-1]["name"],
+                                            projects[-1]["id"])
+        return projects, next_cursor
         
 
     def get_page(self, *, page: int,
@@ -267,102 +446,63 @@ class ProjectService:
                     detail="페이지를 갖고 오는데 실패 했습니다.",
                 )
 
-            if commit.mode == 'local' and commit.page != page:
-                cur.execute(
-                    """\
-                        SELECT content FROM pages
-                        WHERE project_id = %s
-                          and page_number = %s
-                          and commit_id = %s
-                    """,
-                    (self.project._id, page, commit.parent_id)
-                )
-                content = cur.fetchone()
+            # A local commit only changes its own pages; every other page
+            # reads as it is in the commit it is based on.
+            if commit.mode == 'local' and page not in commit.pages:
+                commit_id = commit.parent_id
             else:
-                cur.execute(
-                    """\
-                        SELECT content FROM pages
-                        WHERE project_id = %s
-                        and page_number = %s
-                        and commit_id = %s
-                    """,
-                    (self.project._id, page, commit._id)
-                )
-                content = cur.fetchone()
-            if content:
-                return content[0]
+                commit_id = commit._id
+            if commit_id == None:
+                return ""
+
+            # A local commit's own pages change in place when it's rebased,
+            # and only the merging worker's cache would hear about it, so
+            # only pages of release/develop commits are cached.
+            cacheable = commit_id != commit._id or commit.mode != 'local'
+            cache_key = (self.project._id, page, commit_id)
+            content = ProjectService.page_cache.get(cache_key) \
+                if cacheable else None
+            if content is not None:
+                return content
 
             cur.execute(
                 """\
-                    WITH RECURSIVE commit_chain AS (
-                        SELECT c.*, 0 AS depth
-                        FROM commits c
-                        WHERE c.id = %s
-                        UNION ALL
-                        SELECT parent.*, child.depth + 1
-                        FROM commits parent
-                        INNER JOIN commit_chain child 
-                        ON child.parent_id = parent.id
-                        WHERE NOT EXISTS(
-                            SELECT 1 FROM pages p
-                            WHERE p.project_id = %s
-                              and p.page_number = %s
-                              and p.commit_id = parent.id
-                        )
-                    )
-                    SELECT * FROM commit_chain
-                    ORDER BY depth DESC
+                    SELECT content, content_blob, content_format FROM pages
+                    WHERE project_id = %s
+                      and page_number = %s
+                      and commit_id = %s
                 """,
-                (commit._id, self.project._id, page)
+                (self.project._id, page, commit_id)
             )
-            rows = cur.fetchall()
-            if not rows:
-                return None
-            if rows[0]["parent_id"]:
-                cur.execute(
-                    """\
-                        SELECT content FROM pages
-                        WHERE commit_id = %s
-                    """,
-                    (rows[0]["parent_id"],)
-                )
-                content = cur.fetchone()
-
-                content_blocks = content[0].split('\n')
-            else:
-                content_blocks = [""]
+            row = cur.fetchone()
+            if row:
+                content = ProjectService.decode_page(*row)
+                if cacheable:
+                    ProjectService.page_cache.set(cache_key, content)
+                return content
 
-            for row in rows:
-                cur.execute(
-                    """\
-                        SELECT content, page_number FROM blocks
-                        WHERE project_id = %s
-                          and commit_id = %s
-                        ORDER BY block_index ASC
-                    """,
-                    (self.project._id, row['id'])
-                )
-                block_rows = cur.fetchall()
-                if block_rows[0][1] != page:
-                    continue
-                blcoks = [block_ros[0] for block_ros in block_rows]
-                content_blocks = content_blocks[:row["start_block_index"]]+\
-                                blcoks+\
-                                content_blocks[row["end_block_index"]:]
-            content = "\n".join(content_blocks)
+            content = self._replay_page(commit_id, page, cur)
             cur.execute(
                 """\
                     INSERT INTO pages (
                         project_id,
                         content,
+                        content_blob,
+                        content_format,
                         page_number,
-                        commit_id
+                        commit_id,
+                        search_vector
                     )
-                    VALUES (%s, %s, %s, %s)
+                    VALUES (%s, %s, %s, %s, %s, %s, to_tsvector('simple', %s))
+                    ON CONFLICT DO NOTHING
                 """,
-                (self.project._id, content, page, commit._id)
+                (self.project._id, *ProjectService.encode_page(content),
+                 page, commit_id, content)
             )
-            conn.commit()
+            if cursor == None:
+                conn.commit()
+            if cacheable:
+                ProjectService.page_cache.set(cache_key, content)
         except HTTPException as e:
             raise e
         except Exception as e:
@@ -376,49 +516,465 @@ class ProjectService:
                 conn.close()
         return content
 
-    def insert_page(self, page: int, commit: Commit, parent_max_page: int, cursor: cursor):
-        if page == 0:
-            pass
+    def get_pages(self, *, start: int = 1,
+                  end: Optional[int] = None,
+                  user: Optional[UserModel] = None,
+                  mode: Optional[str] = None,
+                  commit: Optional[Commit] = None):
+        """Read pages ``start``..``end`` (every page by default) at one commit.
+
+        The commit is resolved and checked once. Pages come from the page
+        cache or from one query over ``pages``; only pages found in neither
+        are replayed.
+        """
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+
+            if commit == None and (mode == "release" or mode == "develop"):
+                commit = Commit.get_commit(mode=mode, project=self, cursor=cur)
+                if commit == None:
+                    return []
+
+            if (commit == None
+                or (
+                    user
+                    and commit.status == "normal"
+                    and commit.user != user
+                )):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="페이지를 갖고 오는데 실패 했습니다.",
+                )
+
+            last = commit.max_page if end == None else min(end, commit.max_page)
+            sources = {}
+            local_pages = set(commit.pages)
+            for page in range(max(start, 1), last + 1):
+                if commit.mode == 'local' and page not in local_pages:
+                    sources[page] = commit.parent_id
+                else:
+                    sources[page] = commit._id
+
+            # Same as get_page: a local commit's own pages aren't cached
+            cacheable = {page for page, commit_id in sources.items()
+                         if commit_id != commit._id or commit.mode != 'local'}
+            contents = {}
+            for page, commit_id in sources.items():
+                if page not in cacheable:
+                    continue
+                content = ProjectService.page_cache.get(
+                    (self.project._id, page, commit_id))
+                if content is not None:
+                    contents[page] = content
+
+            missing = [page for page in sources if page not in contents]
+            if missing:
+                cur.execute(
+                    """\
+                        SELECT p.page_number, p.content,
+                               p.content_blob, p.content_format
+                        FROM pages p
+                        JOIN unnest(%s::int[], %s::int[]) AS wanted(commit_id, page_number)
+                          ON p.commit_id = wanted.commit_id
+                         and p.page_number = wanted.page_number
+                    """,
+                    ([sources[page] for page in missing], missing)
+                )
+                for page, *stored in cur.fetchall():
+                    content = ProjectService.decode_page(*stored)
+                    contents[page] = content
+                    if page in cacheable:
+                        ProjectService.page_cache.set(
+                            (self.project._id, page, sources[page]), content)
+
+            for page in sources:
+                if page not in contents:
+                    contents[page] = self.get_page(page=page, commit=commit,
+                                                   cursor=cur)
+            conn.commit()
+        except HTTPException as e:
+            raise e
+        except Exception as e:
+            print(e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="서버 에러",
+            )
+        finally:
+            conn.close()
+        return [(page, contents[page]) for page in sources]
+
+    def search_content(self, *, query: str, commit: Commit,
+                       limit: int, after: Optional[str] = None):
+        """Full-text search over the pages at ``commit``.
+
+        Returns ``([(page, rank, snippet)], next_cursor)`` ordered by rank,
+        best first. Pages of the commit that were never materialized (the
+        page changed by the latest merge, typically) are materialized
+        first, which also indexes them.
+        """
+        if after:
+            after_rank, after_page = decode_cursor(after, float, int)
         else:
-            if commit.parent_id == None or page > parent_max_page:
-                blocks = commit.blocks
-            else:
-                parent = Commit.get_commit(id=commit.parent_id, project=self,cursor=cursor)
-                parent_page = self.get_page(commit=parent, 
-                                            page=commit.page, 
-                                            cursor=cursor)
-                
-                parent_blocks = parent_page.split("\n")
-                blocks = parent_blocks[:commit.old_start]+\
-                        commit.blocks+\
-                        parent_blocks[commit.old_end:]
-            cursor.execute(
+            after_rank = after_page = None
+
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                """\
+                    SELECT g.page_number
+                    FROM generate_series(1, %s) AS g(page_number)
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM pages p
+                        WHERE p.commit_id = %s
+                          and p.page_number = g.page_number
+                    )
+                """,
+                (commit.max_page, commit._id)
+            )
+            for (page,) in cur.fetchall():
+                self.get_page(page=page, commit=commit, cursor=cur)
+            conn.commit()
+
+            cur.execute(
+                """\
+                    SELECT page_number, content, content_blob,
+                           content_format, rank
+                    FROM (
+                        SELECT p.page_number, p.content,
+                               p.content_blob, p.content_format,
+                               ts_rank_cd(p.search_vector, q)::float8 AS rank
+                        FROM pages p,
+                             websearch_to_tsquery('simple', %s) AS q
+                        WHERE p.commit_id = %s
+                          and p.search_vector @@ q
+                    ) hits
+                    WHERE (%s IS NULL
+                           or (rank, -page_number) < (%s::float8, %s))
+                    ORDER BY rank DESC, page_number ASC
+                    LIMIT %s
+                """,
+                (query, commit._id,
+                 after_rank, after_rank, -after_page if after else None,
+                 limit + 1)
+            )
+            rows = cur.fetchall()
+        except HTTPException as e:
+            raise e
+        except Exception as e:
+            print(e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="서버 에러",
+            )
+        finally:
+            conn.close()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["rank"],
+                                        rows[-1]["page_number"])
+        return [(row["page_number"], row["rank"],
+                 make_snippet(ProjectService.decode_page(
+                     row["content"], row["content_blob"],
+                     row["content_format"]), query))
+                for row in rows], next_cursor
+
+    def export_document(self, commit: Commit):
+        """Yield every page at ``commit`` as markdown, in page order.
+
+        Pages are rebuilt in parallel on the export workers, at most
+        ``2 * EXPORT_WORKERS`` ahead of the page being written, so memory
+        stays bounded however long the document is.
+        """
+        executor = get_export_executor()
+        pages = iter(range(1, commit.max_page + 1))
+        pending = deque()
+
+        def submit(page):
+            pending.append((page, executor.submit(self.get_page,
+                                                  page=page,
+                                                  commit=commit)))
+
+        for page in itertools.islice(pages, 2 * EXPORT_WORKERS):
+            submit(page)
+        try:
+            while pending:
+                page, future = pending.popleft()
+                content = future.result()
+                next_page = next(pages, None)
+                if next_page != None:
+                    submit(next_page)
+                yield f"<!-- page {page} -->\n{content}\n\n"
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def materialize_release(self) -> Job:
+        """Write every page of the release tip to ``pages`` in the
+        background, so the first readers of a new release don't pay for
+        the replays. Returns the job tracking the progress."""
+        def run(job: Job):
+            commit = Commit.get_commit(mode="release", project=self)
+            if commit == None:
+                job.total = 0
+                return
+            job.total = commit.max_page
+            for page in range(1, commit.max_page + 1):
+                if job.cancelled:
+                    return
+                self.get_page(page=page, commit=commit)
+                job.advance()
+
+        return jobs.submit("materialize_release", self.project._id, run)
+
+    def diff_pages(self, old_commit: Optional[Commit], new_commit: Commit,
+                   old_page: int, new_page: int,
+                   user: Optional[UserModel] = None):
+        """Blocks changed from ``old_page`` at ``old_commit`` to
+        ``new_page`` at ``new_commit``. A missing commit, or a page past
+        the commit's last page, reads as an empty page."""
+        cacheable = new_commit.mode != "local" \
+                    and (old_commit == None or old_commit.mode != "local")
+        cache_key = (self.project._id,
+                     old_commit.hash if old_commit else None,
+                     new_commit.hash, old_page, new_page)
+        if cacheable:
+            result = ProjectService.diff_cache.get(cache_key)
+            if result is not None:
+                return result
+
+        def blocks(commit, page):
+            if commit == None or page > commit.max_page:
+                return []
+            content = self.get_page(page=page, commit=commit, user=user)
+            return content.split("\n") if content else []
+
+        old = blocks(old_commit, old_page)
+        new = blocks(new_commit, new_page)
+        hunks = [{"old_start": old_start, "old_end": old_end,
+                  "new_start": new_start, "new_end": new_end,
+                  "old": old[old_start:old_end],
+                  "new": new[new_start:new_end]}
+                 for old_start, old_end, new_start, new_end
+                 in diff_blocks(old, new)]
+        result = {
+            "hunks": hunks,
+            "removed": sum(len(hunk["old"]) for hunk in hunks),
+            "added": sum(len(hunk["new"]) for hunk in hunks),
+        }
+        if cacheable:
+            ProjectService.diff_cache.set(cache_key, result)
+        return result
+
+    def _replay_page(self, commit_id: int, page: int, cursor: cursor):
+        """Rebuild ``page`` at a commit from the nearest materialized page.
+
+        One query finds the closest ancestor that has ``page`` in ``pages``
+        (ancestors being the release/develop commits of lower generation)
+        and returns that snapshot followed by one row per later commit,
+        carrying the hunks it made to ``page`` and their blocks if any,
+        oldest commit first. Each commit's hunks are spliced in memory in a
+        single pass, and every ``PAGE_CHECKPOINT_INTERVAL`` commits along
+        the way the intermediate page is saved as a checkpoint so that no
+        later replay through this stretch of history walks further.
+        """
+        cursor.execute(
+            """\
+                WITH target AS (
+                    SELECT id, project_id, generation
+                    FROM commits
+                    WHERE id = %s
+                ),
+                base AS (
+                    SELECT c.id, t.generation - c.generation AS depth
+                    FROM target t
+                    JOIN commits c
+                      ON c.project_id = t.project_id
+                     and c.mode <> 'local'
+                     and c.generation < t.generation
+                    WHERE EXISTS(
+                        SELECT 1 FROM pages p
+                        WHERE p.page_number = %s
+                          and p.commit_id = c.id
+                    )
+                    ORDER BY c.generation DESC
+                    LIMIT 1
+                ),
+                commit_chain AS (
+                    SELECT t.id, 0 AS depth
+                    FROM target t
+                    UNION ALL
+                    SELECT c.id, t.generation - c.generation
+                    FROM target t
+                    JOIN commits c
+                      ON c.project_id = t.project_id
+                     and c.mode <> 'local'
+                     and c.generation < t.generation
+                     and c.generation > t.generation - COALESCE(
+                            (SELECT depth FROM base), t.generation + 1)
+                )
+                SELECT NULL AS id, base.depth, NULL AS hunk_index,
+                       NULL AS start_block_index, NULL AS end_block_index,
+                       NULL AS block_index, p.content,
+                       p.content_blob, p.content_format
+                FROM pages p
+                JOIN base ON p.commit_id = base.id
+                WHERE p.page_number = %s
+                UNION ALL
+                SELECT cc.id, cc.depth, h.hunk_index,
+                       h.start_block_index, h.end_block_index,
+                       b.block_index, bc.content,
+                       NULL, NULL
+                FROM commit_chain cc
+                LEFT JOIN commit_hunks h
+                  ON h.commit_id = cc.id
+                 and h.page_number = %s
+                LEFT JOIN blocks b
+                  ON b.commit_id = h.commit_id
+                 and b.block_index >= h.block_offset
+                 and b.block_index < h.block_offset + h.block_count
+                LEFT JOIN block_contents bc ON bc.hash = b.content_hash
+                ORDER BY depth DESC, hunk_index ASC NULLS FIRST,
+                         block_index ASC NULLS FIRST
+            """,
+            (commit_id, page, page, page)
+        )
+        rows = cursor.fetchall()
+
+        content_blocks = []
+        checkpoints = []
+        i = 0
+        if rows and rows[0]["id"] is None:
+            content_blocks = ProjectService.decode_page(
+                rows[0]["content"], rows[0]["content_blob"],
+                rows[0]["content_format"]).split("\n")
+            i = 1
+        chain_length = len({row["depth"] for row in rows[i:]})
+        since_snapshot = 0
+        while i < len(rows):
+            row = rows[i]
+            blocks = []
+            hunks = []
+            while i < len(rows) and rows[i]["depth"] == row["depth"]:
+                hunk = rows[i]
+                if hunk["hunk_index"] is None:
+                    i += 1
+                    continue
+                new_start = len(blocks)
+                while (i < len(rows) and rows[i]["depth"] == row["depth"]
+                       and rows[i]["hunk_index"] == hunk["hunk_index"]):
+                    if rows[i]["block_index"] is not None:
+                        blocks.append(rows[i]["content"])
+                    i += 1
+                hunks.append((hunk["start_block_index"],
+                              hunk["end_block_index"],
+                              new_start, len(blocks)))
+            if hunks:
+                content_blocks = apply_hunks(content_blocks, blocks, hunks)
+            since_snapshot += 1
+            # Before its first commit the page doesn't exist yet and an
+            # empty snapshot would read back as one empty line.
+            if (PAGE_CHECKPOINT_INTERVAL
+                and since_snapshot >= PAGE_CHECKPOINT_INTERVAL
+                and row["depth"] > 0
+                and content_blocks):
+                snapshot = "\n".join(content_blocks)
+                checkpoints.append((self.project._id,
+                                    *ProjectService.encode_page(snapshot),
+                                    page,
+                                    row["id"],
+                                    snapshot))
+                since_snapshot = 0
+
+        if checkpoints:
+            execute_values(
+                cursor,
                 """\
                     INSERT INTO pages (
                         project_id,
                         content,
+                        content_blob,
+                        content_format,
                         page_number,
-                        commit_id
+                        commit_id,
+                        search_vector
                     )
-                    VALUES (%s, %s, %s, %s)
+                    VALUES %s
+                    ON CONFLICT DO NOTHING
                 """,
-                (self.project._id,
-                "\n".join(blocks),
-                commit.page,
-                commit._id)
+                checkpoints,
+                template="(%s, %s, %s, %s, %s, %s, to_tsvector('simple', %s))"
             )
+        replay_stats.record(chain_length, len(checkpoints))
+        return "\n".join(content_blocks)
+
+    def insert_pages(self, commit: Commit, parent_max_page: Optional[int],
+                     cursor: cursor):
+        """Materialize every page ``commit`` edits, applying all of its
+        hunks on a page in one pass over the parent's page."""
+        parent = None
+        rows = []
+        for page in commit.pages:
+            if commit.parent_id == None or page > parent_max_page:
+                parent_blocks = []
+            else:
+                if parent == None:
+                    parent = Commit.get_commit(id=commit.parent_id,
+                                               project=self, cursor=cursor)
+                parent_blocks = self.get_page(commit=parent,
+                                              page=page,
+                                              cursor=cursor).split("\n")
+            content = "\n".join(apply_hunks(parent_blocks, commit.blocks,
+                                            commit.page_hunks(page)))
+            rows.append((self.project._id,
+                         *ProjectService.encode_page(content),
+                         page,
+                         commit._id,
+                         content))
+        execute_values(
+            cursor,
+            """\
+                INSERT INTO pages (
+                    project_id,
+                    content,
+                    content_blob,
+                    content_format,
+                    page_number,
+                    commit_id,
+                    search_vector
+                )
+                VALUES %s
+            """,
+            rows,
+            template="(%s, %s, %s, %s, %s, %s, to_tsvector('simple', %s))"
+        )
 
     def update_page(self, commit: Commit, cursor: cursor):
-        
+        """Carry materialized pages over to a merged commit.
+
+        Local commits are rebased onto the merged commit, which only
+        changed its own pages, so only the local materializations of those
+        pages in this project are out of date. Returns the ids of the
+        commits whose page was dropped, so that callers can invalidate
+        them once committed.
+        """
         cursor.execute(
             """\
-                DELETE FROM pages
-                WHERE (
-                    SELECT mode FROM commits
-                    WHERE id = commit_id
-                ) = 'local'
-            """
+                DELETE FROM pages p
+                USING commits c
+                WHERE c.id = p.commit_id
+                  and c.project_id = %s
+                  and c.mode = 'local'
+                  and p.page_number = ANY(%s)
+                RETURNING p.commit_id
+            """,
+            (self.project._id, commit.pages)
         )
+        dropped = {row[0] for row in cursor.fetchall()}
         cursor.execute(
             """\
                 SELECT * FROM commits
@@ -428,25 +984,31 @@ class ProjectService:
         parent = cursor.fetchone()
         
         if parent == None:
-            return
+            return dropped
         elif parent["mode"] == "release":
             cursor.execute(
                 """\
                     INSERT INTO pages (
                         project_id,
                         content,
+                        content_blob,
+                        content_format,
                         page_number,
-                        commit_id
+                        commit_id,
+                        search_vector
                     ) 
                     SELECT project_id, 
                            content, 
+                           content_blob,
+                           content_format,
                            page_number,
-                           %s
+                           %s,
+                           search_vector
                     FROM pages
                     WHERE commit_id = %s
-                      and page_number != %s
+                      and page_number <> ALL(%s)
                 """,
-                (commit._id, commit.parent_id, commit.page)
+                (commit._id, commit.parent_id, commit.pages)
             )
         else:
             cursor.execute(
@@ -454,8 +1016,8 @@ class ProjectService:
                     UPDATE pages
                     SET commit_id = %s
                     WHERE commit_id = %s
-                      and page_number != %s
+                      and page_number <> ALL(%s)
                 """,
-                (commit._id, commit.parent_id, commit.page)
+                (commit._id, commit.parent_id, commit.pages)
             )
-        
\ No newline at end of file
+        return dropped
@@ -5,7 +5,10 @@ from fastapi import HTTPException, status
 from psycopg2.extensions import cursor
 from pydantic import BaseModel, PrivateAttr
 from typing import Optional
+from cache import LRUCache
+from config import USER_CACHE_SIZE, USER_CACHE_TTL
 from db import get_connection
+from pagination import decode_cursor, encode_cursor
 
 class UserModel(BaseModel):
     _id: int = PrivateAttr()
@@ -26,6 +29,9 @@ class TokenModel(BaseModel):
 
 
 class UserService:
+    # Resolved users keyed by userid (the JWT ``sub`` claim).
+    cache = LRUCache(USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
     def __init__(self, user: UserModel):
         self.user = user
         
@@ -104,6 +110,23 @@ class UserService:
         user_model._id = user["id"]
         return user_model    
 
+    @staticmethod
+    def get_cached_user(user_id):
+        user = UserService.cache.get(user_id)
+        if user is None:
+            user = UserService.get_user(user_id)
+            if user:
+                UserService.cache.set(user_id, user)
+        return user
+
+    @staticmethod
+    def invalidate_user(user_id: Optional[str] = None):
+        """Drop a cached user after its profile changed, or all if no id."""
+        if user_id is None:
+            UserService.cache.clear()
+        else:
+            UserService.cache.pop(user_id)
+
     @staticmethod
     def get_user_by_id(id, cursor: cursor):
         cursor.execute(
@@ -129,25 +152,48 @@ class UserService:
     def search_user(user_id:Optional[str], 
                     user_name:Optional[str], 
                     user_email:Optional[str],
-                    start: int, end: int, order: str):
+                    start: int, end: int, order: str,
+                    after: Optional[str] = None):
+        """Returns ``(rows, next_cursor)``.
+
+        Rows are ordered by (name, id). Passing the previous page's cursor
+        as ``after`` continues from there instead of skipping ``start`` rows.
+        """
+        limit = end - start
+        if after:
+            after_name, after_id = decode_cursor(after, str, int)
+            start = 0
+        else:
+            after_name = after_id = None
+        op = ">" if order == "ASC" else "<"
+
         conn = get_connection()
         try:
             cur = conn.cursor()
             cur.execute(
                 f"""\
-                    SELECT name, userid, email, organization, description
+                    SELECT name, userid, email, organization, description, id
                     FROM users
                     WHERE (%s IS NULL OR userid = %s)
                       AND (%s IS NULL OR name ILIKE %s)
                       AND (%s IS NULL OR email = %s)
-                    ORDER BY name {order}
+                      AND (%s IS NULL OR (name, id) {op} (%s, %s))
+                    ORDER BY name {order}, id {order}
                     LIMIT %s OFFSET %s
                 """,
                 (user_id, user_id, user_name, f"%{user_name}%", 
-                 user_email, user_email, end-start, start)
+                 user_email, user_email,
+                 after_id, after_name, after_id,
+                 limit + 1, start)
             )
             users = cur.fetchall()
         finally:
             conn.close()
         
-        return users
\ No newline at end of file
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            if users:
+                next_cursor = encode_cursor(users[-1]["name"],
+                                            users[-1]["id"])
+        return [user[:-1] for user in users], next_cursor
\ No newline at end of file
@@ -0,0 +1,38 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from fastapi import HTTPException, status
+
+# Response header carrying the cursor for the next page of a search.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(*key) -> str:
+    """Opaque continuation token for the sort key of the last row returned."""
+    payload = [value.isoformat() if isinstance(value, datetime) else value
+               for value in key]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token: str, *types) -> tuple:
+    """Inverse of ``encode_cursor``; ``types`` gives the type of each key."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list) or len(payload) != len(types):
+            raise ValueError(token)
+        key = []
+        for value, type_ in zip(payload, types):
+            if type_ is datetime:
+                key.append(datetime.fromisoformat(value))
+            elif isinstance(value, type_):
+                key.append(value)
+            else:
+                raise ValueError(token)
+        return tuple(key)
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="잘못된 cursor 값입니다.",
+        )
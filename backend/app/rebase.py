@@ -0,0 +1,54 @@
+import bisect
+import itertools
+
+
+class LocalIntervals:
+    """Block ranges edited by the hunks of a project's local commits,
+    per page.
+
+    Rebasing onto a merged commit only looks at the pages it edited. On
+    each of them a local hunk finds, with one bisect over the merged
+    hunks' ends, the first merged hunk it could overlap and how far the
+    merged hunks before it move its blocks.
+    """
+    def __init__(self, hunks):
+        """``hunks`` yields ``(commit_id, hunk_index, page, start, end)``."""
+        self._pages = {}
+        for commit_id, hunk_index, page, start, end in hunks:
+            self._pages.setdefault(page, []).append(
+                (commit_id, hunk_index, start, end))
+
+    def rebase(self, edits):
+        """Rebase onto a commit whose ``edits`` ``(page, start, end,
+        new_len)`` each replace blocks ``start:end`` of ``page`` with
+        ``new_len`` blocks. Edits on one page don't overlap.
+
+        Returns ``(conflicts, shifts)``: the ids of local commits with a
+        hunk that overlaps an edit (or strictly contains an insertion),
+        and ``{(commit_id, hunk_index): offset}`` for the hunks of the
+        other commits whose block indices move.
+        """
+        pages = {}
+        for page, start, end, new_len in edits:
+            pages.setdefault(page, []).append((start, end, new_len))
+
+        conflicts = set()
+        shifts = {}
+        for page, page_edits in pages.items():
+            page_edits.sort()
+            ends = [end for _, end, _ in page_edits]
+            # offsets[k]: total shift from the first k edits of the page
+            offsets = list(itertools.accumulate(
+                (new_len - (end - start) for start, end, new_len in page_edits),
+                initial=0,
+            ))
+            for commit_id, hunk_index, start, end in self._pages.get(page, ()):
+                k = bisect.bisect_right(ends, start)
+                if k < len(page_edits) and page_edits[k][0] < end:
+                    conflicts.add(commit_id)
+                elif offsets[k]:
+                    shifts[(commit_id, hunk_index)] = offsets[k]
+
+        shifts = {key: offset for key, offset in shifts.items()
+                  if key[0] not in conflicts}
+        return conflicts, shifts
@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status as http_status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status as http_status
 from datetime import date
 from typing import Optional
 
+from config import PROMOTE_MATERIALIZE
+from etag import IMMUTABLE, json_with_etag
+from pagination import NEXT_CURSOR_HEADER
 from middlewares.get_user import get_current_user
 from models.user_model import UserModel
 from models.project_model import ProjectService
@@ -25,11 +28,6 @@ def create_commit(project_id: int, commit_form: CommitCreateForm,
             status_code=http_status.HTTP_401_UNAUTHORIZED,
             detail="커밋을 만들 권한이 없습니다.",
         )
-    if commit_form.page <= 0:
-        raise HTTPException(
-            status_code=http_status.HTTP_400_BAD_REQUEST,
-            detail="페이지 값은 1 이상이어야 합니다.",
-        )
 
     commit = Commit(commit_form, project, user)
     hash = commit.create_commit()
@@ -78,7 +76,14 @@ def patch_commit(project_id: int, commit_form: CommitPatchForm,
                 "hash": hash}
     elif commit_form.cmd == "promote":
         Commit.promote_commit(project)
-        return {"msg": "release mode로 승격했습니다."}
+        materialize = commit_form.materialize
+        if materialize == None:
+            materialize = PROMOTE_MATERIALIZE
+        if not materialize:
+            return {"msg": "release mode로 승격했습니다."}
+        job = project.materialize_release()
+        return {"msg": "release mode로 승격했습니다.",
+                "job_id": job.id}
     
     
 @router.get("/{project_id}/search")
@@ -88,9 +93,12 @@ def search(project_id: int,
            status: Optional[str] = None, 
            user_id: Optional[str] = None, 
            title: Optional[str] = None,
+           q: Optional[str] = None,
            start_date: Optional[date] = None, 
            end_date: Optional[date] = None, 
            start:int = 0, end:int = 10,
+           cursor: Optional[str] = None,
+           if_none_match: Optional[str] = Header(None),
            current_user: UserModel = Depends(get_current_user)):
     if current_user == None:
         raise HTTPException(
@@ -121,54 +129,129 @@ def search(project_id: int,
                "parent_hash"]
 
     if status == "normal":
-        commits = [
-            dict(zip(columns, row))
-                for row in Commit.search_without_chain(
-                    project,
-                    current_user.userid,
-                    status,
-                    mode,
-                    title,
-                    start_date,
-                    end_date,
-                    start, 
-                    end
-                )
-        ]
+        rows, next_cursor = Commit.search_without_chain(
+            project,
+            current_user.userid,
+            status,
+            mode,
+            title,
+            start_date,
+            end_date,
+            start, 
+            end,
+            after=cursor,
+            q=q
+        )
     elif (status == "push"
           or user_id
           or title
+          or q
           or (start_date and end_date)):
         
-        commits = [
-            dict(zip(columns, row))
-                for row in Commit.search_without_chain(
-                    project,
-                    user_id,
-                    status,
-                    mode,
-                    title,
-                    start_date,
-                    end_date,
-                    start,
-                    end
-                )
-        ]
+        rows, next_cursor = Commit.search_without_chain(
+            project,
+            user_id,
+            status,
+            mode,
+            title,
+            start_date,
+            end_date,
+            start,
+            end,
+            after=cursor,
+            q=q
+        )
     elif mode or start_hash:
-        commits = [
-            dict(zip(columns, row))
-                for row in Commit.search_with_chain(
-                    project,
-                    start_hash,
-                    mode,
-                    start,
-                    end
-                )
-        ]
+        rows, next_cursor = Commit.search_with_chain(
+            project,
+            start_hash,
+            mode,
+            start,
+            end,
+            after=cursor
+        )
     else:
         raise HTTPException(
             status_code=http_status.HTTP_400_BAD_REQUEST,
             detail="잘못된 값을 입력했습니다.",
         )
+    commits = [dict(zip(columns, row)) for row in rows]
     
-    return commits
\ No newline at end of file
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return json_with_etag(commits, if_none_match, headers)
+
+
+@router.get("/{project_id}/diff")
+def diff(project_id: int,
+         to: str,
+         from_hash: Optional[str] = Query(None, alias="from"),
+         page: Optional[int] = None,
+         to_page: Optional[int] = None,
+         if_none_match: Optional[str] = Header(None),
+         current_user: UserModel = Depends(get_current_user)):
+    if current_user == None:
+        raise HTTPException(
+            status_code=http_status.HTTP_401_UNAUTHORIZED,
+            detail="로그인이 필요합니다.",
+        )
+    project = ProjectService.get_project(project_id)
+    auth_level = project.get_user_auth_level(current_user)
+    if auth_level >= 3:
+        raise HTTPException(
+            status_code=http_status.HTTP_401_UNAUTHORIZED,
+            detail="프로젝트를 읽을 권한이 없습니다.",
+        )
+
+    # Without from, show what the commit itself changed: the diff against
+    # its parent. Without page, one diff per page the commit edited.
+    new_commit = Commit.get_commit(hash=to, project=project)
+    if from_hash:
+        old_commit = Commit.get_commit(hash=from_hash, project=project)
+    elif new_commit != None and new_commit.parent_id != None:
+        old_commit = Commit.get_commit(id=new_commit.parent_id,
+                                       project=project)
+    else:
+        old_commit = None
+    if new_commit == None or (from_hash and old_commit == None):
+        raise HTTPException(
+            status_code=http_status.HTTP_404_NOT_FOUND,
+            detail="커밋을 찾을 수 없습니다.",
+        )
+    commits = [commit for commit in [old_commit, new_commit] if commit]
+    if auth_level == 2 and any(commit.mode != "release" for commit in commits):
+        raise HTTPException(
+            status_code=http_status.HTTP_401_UNAUTHORIZED,
+            detail="viewer 권한은 release 모드만 볼 수 있습니다.",
+        )
+
+    if page == None and to_page != None:
+        raise HTTPException(
+            status_code=http_status.HTTP_400_BAD_REQUEST,
+            detail="to_page는 page와 함께 지정해야 합니다.",
+        )
+    if (page != None and page <= 0) or (to_page != None and to_page <= 0):
+        raise HTTPException(
+            status_code=http_status.HTTP_400_BAD_REQUEST,
+            detail="페이지 값은 1 이상이어야 합니다.",
+        )
+
+    content = {"from": old_commit.hash if old_commit else None,
+               "to": new_commit.hash}
+    if page != None:
+        if to_page == None:
+            to_page = page
+        content.update(page=page, to_page=to_page,
+                       **project.diff_pages(old_commit, new_commit, page,
+                                            to_page, user=current_user))
+    else:
+        pages = [{"page": page, "to_page": page,
+                  **project.diff_pages(old_commit, new_commit, page, page,
+                                       user=current_user)}
+                 for page in new_commit.pages]
+        content.update(pages=pages,
+                       removed=sum(diff["removed"] for diff in pages),
+                       added=sum(diff["added"] for diff in pages))
+    headers = {}
+    if all(commit.mode != "local" for commit in commits):
+        headers["Cache-Control"] = IMMUTABLE
+    return json_with_etag(content, if_none_match, headers)
\ No newline at end of file
@@ -6,7 +6,9 @@ from fastapi.responses import JSONResponse
 from jose import jwt
 from typing import Optional
 
+from concurrency import run_blocking
 from middlewares.get_user import get_current_user
+from pagination import NEXT_CURSOR_HEADER
 from models.user_model import UserModel, UserService, TokenModel
 from config import SECRET_KEY, ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM
 router = APIRouter()
@@ -16,7 +18,8 @@ async def login(
     response: Response, 
     form_data: OAuth2PasswordRequestForm = Depends()
 ):
-    userid = UserService.login_user(form_data.username, form_data.password)
+    userid = await run_blocking(UserService.login_user,
+                                form_data.username, form_data.password)
     if userid:
         data = {
             "sub":userid,
@@ -50,7 +53,8 @@ async def logout(response: Response):
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends()
 ):
-    userid = UserService.login_user(form_data.username, form_data.password)
+    userid = await run_blocking(UserService.login_user,
+                                form_data.username, form_data.password)
     if userid:
         data = {
             "sub":userid,
@@ -101,8 +105,9 @@ async def signup(user: UserModel):
             detail="비밀번호가 일치하지 않습니다",
         )
 
-    if UserService.create_user(user.userid, user.password, user.name,
-                               user.phone, user.email, user.org, user.desc):
+    if await run_blocking(UserService.create_user,
+                          user.userid, user.password, user.name,
+                          user.phone, user.email, user.org, user.desc):
         return {"msg": "회원가입 성공"}
     else:
         raise HTTPException(
@@ -112,30 +117,32 @@ async def signup(user: UserModel):
         
     
 @router.get("/")
-def search_user(user_id: Optional[str] = None, 
+def search_user(response: Response,
+                user_id: Optional[str] = None, 
                 user_name: Optional[str] = None, 
                 user_email: Optional[str] = None, 
                 start: int = 0,
                 end: int = 10,
-                order: str = "ASC"):
+                order: str = "ASC",
+                cursor: Optional[str] = None):
     if order not in ["ASC", "DESC"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="정렬 방식이 잘못되었습니다.",
         )
     columns = ["name", "userid", "email", "organization", "description"]
-    users = [
-        dict(zip(columns, row))
-        for row in UserService.search_user(user_id=user_id, user_name=user_name,
-                                user_email=user_email, start=start,
-                                end=end, order=order)
-    ]
+    rows, next_cursor = UserService.search_user(
+        user_id=user_id, user_name=user_name, user_email=user_email,
+        start=start, end=end, order=order, after=cursor)
+    users = [dict(zip(columns, row)) for row in rows]
     if not users:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="검색하신 유저를 찾을 수 없습니다.",
         )
     
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return users
 
 @router.get("/me")
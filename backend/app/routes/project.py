@@ -1,7 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import Optional
 
+from concurrency import run_blocking
+from pagination import NEXT_CURSOR_HEADER
+from etag import tagged_commit
+from jobs import jobs
 from middlewares.get_user import get_current_user
 from models.user_model import UserModel, UserService
 from models.project_model import ProjectModel, ProjectService
@@ -24,23 +28,26 @@ async def create(project_form: ProjectModel,
             detail="프로젝트 이름(name)은 필수 항목입니다."
         )
 
-    project = ProjectService.create_project(project_form.name,
-                                            project_form.org,
-                                            project_form.desc)
+    project = await run_blocking(ProjectService.create_project,
+                                 project_form.name,
+                                 project_form.org,
+                                 project_form.desc)
     if not project:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="프로젝트 생성에 실패 했습니다. 입력 값을 확인해 주세요."
         )
     
-    project.add_admin(user._id)
+    await run_blocking(project.add_admin, user._id)
     
     return {"detail": "프로젝트 생성을 성공했습니다.", 
             "project_id": project.project._id}
 
 @router.get("/search")
-def search_project(name: str = "", start: int = 0, end: int = 10, 
-                   order: str = "ASC", role: Optional[str] = None, userid: Optional[str] = None):
+def search_project(response: Response,
+                   name: str = "", start: int = 0, end: int = 10, 
+                   order: str = "ASC", role: Optional[str] = None, userid: Optional[str] = None,
+                   cursor: Optional[str] = None):
     
     if order not in ["ASC", "DESC"]:
         raise HTTPException(
@@ -58,17 +65,20 @@ def search_project(name: str = "", start: int = 0, end: int = 10,
             detail="order 값은 ASC 또는 DESC 값 중 하나여야 합니다.",
         )
     columns = ["id", "name", "organization", "description"]
-    projects = [
-        dict(zip(columns, row))
-        for row in ProjectService.search_project(name=name, start=start,
-                                end=end, order=order, role=role, userid=userid)
-    ]
+    rows, next_cursor = ProjectService.search_project(
+        name=name, start=start, end=end, order=order, role=role,
+        userid=userid, after=cursor)
+    projects = [dict(zip(columns, row)) for row in rows]
 
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return projects
 
 @router.get("/{project_id}")
-async def view(project_id: int, page: int, mode: Optional[str] = None,
+async def view(project_id: int, page: int, response: Response,
+         mode: Optional[str] = None,
          hash: Optional[str] = None,
+         if_none_match: Optional[str] = Header(None),
          user: UserModel = Depends(get_current_user)):
     if user == None:
         raise HTTPException(
@@ -76,8 +86,8 @@ async def view(project_id: int, page: int, mode: Optional[str] = None,
             detail="로그인이 필요합니다.",
         )
     
-    project = ProjectService.get_project(project_id)
-    auth_level = project.get_user_auth_level(user)
+    project = await run_blocking(ProjectService.get_project, project_id)
+    auth_level = await run_blocking(project.get_user_auth_level, user)
     
     if auth_level >= 3 \
        or (auth_level == 2 and mode != "release"):
@@ -87,19 +97,151 @@ async def view(project_id: int, page: int, mode: Optional[str] = None,
         )
     
     
-    if hash:
-        commit = Commit.get_commit(hash=hash, project=project)
-    else:
-        commit = None
+    not_modified, commit, etag, cache_control = await tagged_commit(
+        project, user, if_none_match, page, hash=hash, mode=mode)
+    if not_modified:
+        return not_modified
     
-    page = project.get_page(mode=mode, page=page, user=user, commit=commit)
-    if page == None:
+    docs = await run_blocking(project.get_page, mode=mode, page=page,
+                              user=user, commit=commit)
+    if docs == None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="페이지를 갖고 오는데 실패 했습니다.",
         )
 
-    return {"docs":page}
+    if etag:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = cache_control
+    return {"docs":docs}
+
+@router.get("/{project_id}/pages")
+async def view_pages(project_id: int, response: Response,
+                     start: int = 1,
+                     end: Optional[int] = None,
+                     mode: Optional[str] = None,
+                     hash: Optional[str] = None,
+                     if_none_match: Optional[str] = Header(None),
+                     user: UserModel = Depends(get_current_user)):
+    if user == None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="로그인이 필요합니다.",
+        )
+
+    project = await run_blocking(ProjectService.get_project, project_id)
+    auth_level = await run_blocking(project.get_user_auth_level, user)
+
+    if auth_level >= 3 \
+       or (auth_level == 2 and mode != "release"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="프로젝트를 읽을 권한이 없습니다.",
+        )
+
+    not_modified, commit, etag, cache_control = await tagged_commit(
+        project, user, if_none_match, "pages", start, end,
+        hash=hash, mode=mode)
+    if not_modified:
+        return not_modified
+
+    pages = await run_blocking(project.get_pages, start=start, end=end,
+                               mode=mode, user=user, commit=commit)
+
+    if etag:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = cache_control
+    return [{"page": page, "docs": docs} for page, docs in pages]
+
+@router.get("/{project_id}/export")
+async def export(project_id: int, mode: str = "release",
+                 hash: Optional[str] = None,
+                 user: UserModel = Depends(get_current_user)):
+    if user == None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="로그인이 필요합니다.",
+        )
+    if mode not in ["release", "develop"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="mode 값은 release, develop 중 하나여야 합니다.",
+        )
+
+    project = await run_blocking(ProjectService.get_project, project_id)
+    auth_level = await run_blocking(project.get_user_auth_level, user)
+
+    if auth_level >= 3 \
+       or (auth_level == 2 and (mode != "release" or hash)):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="프로젝트를 읽을 권한이 없습니다.",
+        )
+
+    if hash:
+        commit = await run_blocking(Commit.get_commit,
+                                    hash=hash, project=project)
+    else:
+        commit = await run_blocking(Commit.get_commit,
+                                    mode=mode, project=project)
+    if commit == None \
+       or (commit.status == "normal" and commit.user != user):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="내보낼 문서가 없습니다.",
+        )
+
+    return StreamingResponse(
+        project.export_document(commit),
+        media_type="text/markdown; charset=utf-8",
+        headers={
+            "Content-Disposition":
+                f'attachment; filename="project-{project_id}-{commit.hash[:12]}.md"'
+        },
+    )
+
+@router.get("/{project_id}/search-content")
+async def search_content(project_id: int, q: str, response: Response,
+                         mode: str = "release", limit: int = 10,
+                         cursor: Optional[str] = None,
+                         user: UserModel = Depends(get_current_user)):
+    if user == None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="로그인이 필요합니다.",
+        )
+    if mode not in ["release", "develop"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="mode 값은 release, develop 중 하나여야 합니다.",
+        )
+    if not q.strip() or limit <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="잘못된 값을 입력했습니다.",
+        )
+
+    project = await run_blocking(ProjectService.get_project, project_id)
+    auth_level = await run_blocking(project.get_user_auth_level, user)
+
+    if auth_level >= 3 \
+       or (auth_level == 2 and mode != "release"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="프로젝트를 읽을 권한이 없습니다.",
+        )
+
+    commit = await run_blocking(Commit.get_commit, mode=mode, project=project)
+    if commit == None:
+        return []
+
+    hits, next_cursor = await run_blocking(project.search_content,
+                                           query=q, commit=commit,
+                                           limit=limit, after=cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return [{"page": page, "rank": rank, "snippet": snippet}
+            for page, rank, snippet in hits]
 
 @router.patch("/{project_id}")
 def edit(project_id: int, role: str, userid: str, 
@@ -138,6 +280,38 @@ def edit(project_id: int, role: str, userid: str,
         )
 
     return {"detail": "유저 권한을 성공적으로 변경했습니다."}
+
+def _require_project_admin(project_id: int, user: UserModel):
+    if user == None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="로그인이 필요합니다.",
+        )
+    
+    project = ProjectService.get_project(project_id)
+    if project.get_user_auth_level(user) != 0:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="관리자만 가능합니다.",
+        )
+
+@router.get("/{project_id}/jobs")
+def get_jobs(project_id: int,
+             user: UserModel = Depends(get_current_user)):
+    _require_project_admin(project_id, user)
+    return [job.to_dict() for job in jobs.list(project_id)]
+
+@router.get("/{project_id}/jobs/{job_id}")
+def get_job(project_id: int, job_id: int,
+            user: UserModel = Depends(get_current_user)):
+    _require_project_admin(project_id, user)
+    job = jobs.get(job_id)
+    if job == None or job.project_id != project_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="작업을 찾을 수 없습니다.",
+        )
+    return job.to_dict()
     
 @router.get("/{project_id}/users")
 def get_user_info(project_id: int, 
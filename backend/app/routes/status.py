@@ -0,0 +1,52 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from db import pool_stats
+from jobs import jobs
+from middlewares.admin_token import require_admin_token
+from slow_queries import slow_queries
+from models.user_model import UserService
+from models.project_model import ProjectService, replay_stats
+
+# Operational data about the whole server, not one user's projects
+router = APIRouter(dependencies=[Depends(require_admin_token)])
+
+@router.get("/pool")
+def get_pool_stats():
+    return pool_stats() or {}
+
+@router.get("/cache")
+def get_cache_stats():
+    return {"users": UserService.cache.stats(),
+            "pages": ProjectService.page_cache.stats(),
+            "diffs": ProjectService.diff_cache.stats()}
+
+@router.get("/replay")
+def get_replay_stats():
+    return replay_stats.stats()
+
+@router.get("/jobs")
+def get_jobs(project_id: Optional[int] = None):
+    return [job.to_dict() for job in jobs.list(project_id)]
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: int):
+    job = jobs.get(job_id)
+    if job == None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="작업을 찾을 수 없습니다.",
+        )
+    return job.to_dict()
+
+@router.get("/slow-queries")
+def get_slow_queries(limit: Optional[int] = None):
+    return {"enabled": slow_queries.enabled,
+            "threshold_ms": slow_queries.threshold * 1000,
+            "queries": slow_queries.entries(limit)}
+
+@router.delete("/slow-queries")
+def clear_slow_queries():
+    slow_queries.clear()
+    return {"detail": "느린 쿼리 기록을 비웠습니다."}
\ No newline at end of file
@@ -0,0 +1,157 @@
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from psycopg2.extensions import cursor as plain_cursor, encodings
+
+from config import SLOW_QUERY_MS, SLOW_QUERY_EXPLAIN_SAMPLE, \
+                   SLOW_QUERY_LOG_SIZE, SLOW_QUERY_REDACT
+
+# Only plain reads are re-run under EXPLAIN ANALYZE; anything that could
+# write, lock rows or call a function not known to be free of side effects
+# (pg_advisory_lock(), nextval(), ...) is logged without a plan.
+_READ_ONLY = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+_WRITES = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|FOR\s+(KEY\s+)?SHARE)\b", re.IGNORECASE
+)
+# Anything followed by "(": a function call, a keyword, or after AS a
+# CTE or a column alias list
+_CALL = re.compile(r"(\bAS\s+)?\b(\w+)\s*\(", re.IGNORECASE)
+_EXPLAIN_CALLS = frozenset((
+    "all", "and", "any", "as", "by", "else", "exists", "from", "in", "join",
+    "not", "on", "or", "over", "select", "then", "using", "values", "when",
+    "where", "with",
+    "array_agg", "coalesce", "count", "generate_series", "greatest",
+    "least", "length", "lower", "max", "min", "now", "octet_length",
+    "pg_total_relation_size", "sum", "to_tsvector", "ts_rank_cd",
+    "unnest", "upper", "websearch_to_tsquery",
+))
+# A string literal as psycopg2 quotes it into a statement
+_LITERAL = re.compile(r"'(?:[^']|'')*'")
+PARAM_CHARS = 200
+
+
+class SlowQueryLog:
+    """Ring buffer of statements slower than ``threshold`` seconds.
+
+    A ``sample`` fraction of the logged SELECT/WITH statements is run a
+    second time under ``EXPLAIN (ANALYZE, BUFFERS)`` on the same
+    connection, read-only inside a savepoint that is rolled back, and the
+    plan is kept with the entry.
+    That second run costs as much as the first, which is why it is
+    sampled.
+    """
+    def __init__(self, threshold: float, sample: float, size: int,
+                 redact: bool):
+        self.threshold = threshold
+        self.sample = sample
+        self.redact = redact
+        self._entries = deque(maxlen=size)
+        self._ids = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def record(self, cur, query, params, seconds: float,
+               route: Optional[str]):
+        # execute_values() and mogrify() hand over bytes, with the
+        # parameters already quoted into the statement
+        inlined = isinstance(query, bytes)
+        query = _query_text(cur, query)
+        plan = None
+        if random.random() < self.sample and _explainable(query):
+            plan = self._explain(cur.connection, query, params)
+        entry = {
+            "time": time.time(),
+            "duration_ms": round(seconds * 1000, 3),
+            "route": route,
+            "query": self._query(query.strip(), inlined),
+            "params": self._params(params),
+            "plan": plan,
+        }
+        with self._lock:
+            self._ids += 1
+            entry["id"] = self._ids
+            self._entries.append(entry)
+
+    def _query(self, query: str, inlined: bool) -> str:
+        if self.redact and inlined:
+            return _LITERAL.sub("?", query)
+        return query
+
+    def _params(self, params):
+        if params is None:
+            return None
+        if self.redact:
+            if isinstance(params, dict):
+                return {key: type(value).__name__
+                        for key, value in params.items()}
+            return [type(value).__name__ for value in params]
+        if isinstance(params, dict):
+            return {key: repr(value)[:PARAM_CHARS]
+                    for key, value in params.items()}
+        return [repr(value)[:PARAM_CHARS] for value in params]
+
+    @staticmethod
+    def _explain(conn, query: str, params) -> Optional[str]:
+        if conn.autocommit:
+            # Nothing to roll the second run back with
+            return None
+        # A plain cursor, so the EXPLAIN isn't counted or logged itself
+        explain = conn.cursor(cursor_factory=plain_cursor)
+        try:
+            explain.execute("SAVEPOINT slow_query_explain")
+            try:
+                explain.execute("SET LOCAL transaction_read_only = on")
+                explain.execute(
+                    "EXPLAIN (ANALYZE, BUFFERS) " + query, params
+                )
+                plan = "\n".join(row[0] for row in explain.fetchall())
+            except Exception as e:
+                print(e)
+                plan = None
+            # Also undoes the SET LOCAL
+            explain.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            explain.execute("RELEASE SAVEPOINT slow_query_explain")
+            return plan
+        except Exception as e:
+            print(e)
+            return None
+        finally:
+            explain.close()
+
+    def entries(self, limit: Optional[int] = None):
+        with self._lock:
+            entries = list(self._entries)
+        entries.reverse()
+        return entries if limit == None else entries[:limit]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _explainable(query: str) -> bool:
+    if not _READ_ONLY.match(query) or _WRITES.search(query):
+        return False
+    return all(alias or name.lower() in _EXPLAIN_CALLS
+               for alias, name in _CALL.findall(_LITERAL.sub("''", query)))
+
+
+def _query_text(cur, query) -> str:
+    if isinstance(query, bytes):
+        encoding = encodings.get(cur.connection.encoding, "utf-8")
+        return query.decode(encoding, "replace")
+    if hasattr(query, "as_string"):
+        # psycopg2.sql.Composable
+        return query.as_string(cur)
+    return str(query)
+
+
+slow_queries = SlowQueryLog(SLOW_QUERY_MS / 1000, SLOW_QUERY_EXPLAIN_SAMPLE,
+                            SLOW_QUERY_LOG_SIZE, SLOW_QUERY_REDACT)
@@ -0,0 +1,120 @@
+"""Report how much space block text takes and what deduplication saves.
+
+Block text is stored once per distinct line in ``block_contents``; this
+compares that with the text every ``blocks`` row would hold on its own,
+and lists the on-disk size of the tables involved. With ``--reclaim``
+it first deletes block text no block references any more; merges do
+this for the commits they drop, this sweeps up whatever is left.
+
+    python storage_report.py
+    python storage_report.py --json
+    python storage_report.py --reclaim
+"""
+import argparse
+import json
+
+from db import get_connection
+from models.commit_model import Commit
+
+# sha256 digest kept in every blocks row instead of the text.
+HASH_BYTES = 32
+
+def collect(cur):
+    cur.execute(
+        """\
+            SELECT count(*),
+                   coalesce(sum(octet_length(bc.content)), 0)
+            FROM blocks b
+            JOIN block_contents bc ON bc.hash = b.content_hash
+        """
+    )
+    blocks, referenced_bytes = cur.fetchone()
+    cur.execute(
+        """\
+            SELECT count(*),
+                   coalesce(sum(octet_length(content)), 0)
+            FROM block_contents
+        """
+    )
+    contents, stored_bytes = cur.fetchone()
+    cur.execute(
+        """\
+            SELECT count(*) FROM block_contents bc
+            WHERE NOT EXISTS (
+                SELECT 1 FROM blocks b WHERE b.content_hash = bc.hash
+            )
+        """
+    )
+    unreferenced, = cur.fetchone()
+    cur.execute(
+        """\
+            SELECT count(*),
+                   count(*) FILTER (WHERE content_format <> 0),
+                   coalesce(sum(octet_length(content)), 0)
+                   + coalesce(sum(octet_length(content_blob)), 0)
+            FROM pages
+        """
+    )
+    pages, compressed_pages, page_bytes = cur.fetchone()
+    cur.execute(
+        """\
+            SELECT relname, pg_total_relation_size(oid)
+            FROM pg_class
+            WHERE relname IN ('blocks', 'block_contents', 'pages')
+              and relkind = 'r'
+        """
+    )
+    table_bytes = dict(cur.fetchall())
+
+    saved_bytes = referenced_bytes - stored_bytes - HASH_BYTES * blocks
+    return {
+        "blocks": blocks,
+        "distinct_contents": contents,
+        "unreferenced_contents": unreferenced,
+        "block_text_bytes": referenced_bytes,
+        "stored_text_bytes": stored_bytes,
+        "hash_bytes": HASH_BYTES * blocks,
+        "saved_bytes": saved_bytes,
+        "dedup_ratio": (round(referenced_bytes / stored_bytes, 2)
+                        if stored_bytes else None),
+        "pages": pages,
+        "compressed_pages": compressed_pages,
+        "page_stored_bytes": page_bytes,
+        "table_bytes": table_bytes,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Report block text storage and deduplication savings.")
+    parser.add_argument("--json", action="store_true",
+                        help="print the report as JSON")
+    parser.add_argument("--reclaim", action="store_true",
+                        help="delete unreferenced block text first")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        reclaimed = None
+        if args.reclaim:
+            reclaimed = Commit.reclaim_block_contents(cur)
+            conn.commit()
+        report = collect(cur)
+        conn.rollback()
+    finally:
+        conn.close()
+    if reclaimed is not None:
+        report["reclaimed_contents"] = reclaimed
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for key, value in report.items():
+        if key == "table_bytes":
+            for table, size in sorted(value.items()):
+                print(f"{table} on disk: {size}")
+        else:
+            print(f"{key}: {value}")
+
+if __name__ == "__main__":
+    main()
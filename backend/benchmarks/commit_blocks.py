@@ -0,0 +1,105 @@
+"""Commit latency against the number of blocks (lines) in the commit.
+
+Times ``Commit.create_commit`` end to end, and, for comparison, the old
+one-INSERT-per-block loop inside a rolled-back transaction. Needs a
+throwaway database reachable through the usual DB_* variables; the
+benchmark creates its own user and project and deletes them afterwards.
+
+    DB_HOST=localhost python benchmarks/commit_blocks.py --blocks 10 100 1000 5000
+"""
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from db import get_connection
+from models.commit_model import Commit, CommitCreateForm
+from models.project_model import ProjectService
+from models.user_model import UserService
+
+
+def per_row_insert(project_id: int, commit_id: int, blocks):
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        started = time.perf_counter()
+        for index, block in enumerate(blocks):
+            content_hash = hashlib.sha256(block.encode()).digest()
+            cur.execute(
+                """\
+                INSERT INTO block_contents (hash, content)
+                VALUES (%s, %s)
+                ON CONFLICT DO NOTHING
+                """,
+                (content_hash, block)
+            )
+            cur.execute(
+                """\
+                INSERT INTO blocks (
+                    project_id, page_number, block_index, content_hash,
+                    commit_id
+                )
+                VALUES (%s, %s, %s, %s, %s)
+                """,
+                (project_id, 1, 1_000_000 + index, content_hash, commit_id)
+            )
+        elapsed = time.perf_counter() - started
+        conn.rollback()
+    finally:
+        conn.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--blocks", type=int, nargs="+",
+                        default=[10, 100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    userid = f"bench-{uuid.uuid4().hex[:12]}"
+    UserService.create_user(userid, "bench", "bench")
+    user = UserService.get_user(userid)
+    project = ProjectService.create_project(f"bench {userid}")
+    results = []
+    try:
+        for count in args.blocks:
+            docs = "\n".join(f"line {i} of the benchmark page"
+                             for i in range(count))
+            batched, per_row = [], []
+            for _ in range(args.repeat):
+                form = CommitCreateForm(old_start=0, old_end=0, page=1,
+                                        docs=docs, title="bench",
+                                        desc="")
+                commit = Commit(form, project, user)
+                started = time.perf_counter()
+                commit.create_commit()
+                batched.append(time.perf_counter() - started)
+                per_row.append(per_row_insert(project.project._id,
+                                              commit._id, commit.blocks))
+            results.append({
+                "blocks": count,
+                "create_commit_ms": round(statistics.median(batched) * 1000, 2),
+                "per_row_inserts_ms": round(statistics.median(per_row) * 1000, 2),
+            })
+    finally:
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM projects WHERE id = %s",
+                        (project.project._id,))
+            cur.execute("DELETE FROM users WHERE userid = %s", (userid,))
+            conn.commit()
+        finally:
+            conn.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
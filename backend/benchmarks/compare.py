@@ -0,0 +1,50 @@
+"""Compare two ``suite.py`` result files scenario by scenario.
+
+Prints the median of each scenario in both runs and the ratio
+after/before, and warns when the runs used a different shape, seed or
+settings, since their numbers are then not comparable.
+
+    python benchmarks/compare.py before.json after.json
+"""
+import argparse
+import json
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--metric", default="median_ms",
+                        choices=["median_ms", "p95_ms", "min_ms", "max_ms"])
+    args = parser.parse_args()
+
+    before, after = load(args.before), load(args.after)
+    for key in ["shape", "seed", "repeat"]:
+        if before.get(key) != after.get(key):
+            print(f"warning: {key} differs: "
+                  f"{before.get(key)} vs {after.get(key)}")
+    if before["meta"].get("settings") != after["meta"].get("settings"):
+        print("warning: settings differ: "
+              f"{before['meta'].get('settings')} vs "
+              f"{after['meta'].get('settings')}")
+
+    names = [name for name in before["results"] if name in after["results"]]
+    width = max([len(name) for name in names] + [8])
+    print(f"{'scenario':<{width}}  {'before':>10}  {'after':>10}  "
+          f"{'ratio':>7}")
+    for name in names:
+        old = before["results"][name][args.metric]
+        new = after["results"][name][args.metric]
+        ratio = f"{new / old:.2f}x" if old else "-"
+        print(f"{name:<{width}}  {old:>10.3f}  {new:>10.3f}  {ratio:>7}")
+    for name in before["results"].keys() ^ after["results"].keys():
+        print(f"{name}: only in one of the runs")
+
+
+if __name__ == "__main__":
+    main()
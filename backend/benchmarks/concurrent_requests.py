@@ -0,0 +1,113 @@
+"""Concurrent-request throughput of async routes, before and after offloading.
+
+Two ASGI apps expose the same ``async def`` route. The "inline" app calls
+a blocking function directly, the way ``routes/project.py::view`` used to
+call psycopg2; the "offloaded" app wraps it in ``run_blocking``. The
+blocking function sleeps for ``--work-ms`` to stand in for a database
+round trip or a bcrypt hash.
+
+    python benchmarks/concurrent_requests.py --requests 200 --concurrency 32
+
+Pass ``--url`` to instead hammer a running backend, e.g. one build before
+and one after a change:
+
+    python benchmarks/concurrent_requests.py \\
+        --url "http://localhost:8000/project/1?page=1&mode=develop" \\
+        --token <bearer token>
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from concurrency import run_blocking
+
+
+def build_app(work_seconds: float, offload: bool) -> FastAPI:
+    app = FastAPI()
+
+    def blocking_call():
+        time.sleep(work_seconds)
+        return "ok"
+
+    @app.get("/work")
+    async def work():
+        if offload:
+            return {"docs": await run_blocking(blocking_call)}
+        return {"docs": blocking_call()}
+
+    return app
+
+
+async def fire(client: httpx.AsyncClient, url: str,
+               requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(url)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 4),
+        "requests_per_second": round(requests / elapsed, 2),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+
+async def run_local(args):
+    results = {}
+    for name, offload in [("inline", False), ("offloaded", True)]:
+        app = build_app(args.work_ms / 1000, offload)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport,
+                                     base_url="http://bench") as client:
+            results[name] = await fire(client, "/work",
+                                       args.requests, args.concurrency)
+    return results
+
+
+async def run_remote(args):
+    headers = {}
+    if args.token:
+        headers["Authorization"] = f"Bearer {args.token}"
+    async with httpx.AsyncClient(headers=headers, timeout=60) as client:
+        return {"remote": await fire(client, args.url,
+                                     args.requests, args.concurrency)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--work-ms", type=float, default=20)
+    parser.add_argument("--url")
+    parser.add_argument("--token")
+    args = parser.parse_args()
+
+    if args.url:
+        results = asyncio.run(run_remote(args))
+    else:
+        results = asyncio.run(run_local(args))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Synthetic projects of a configurable shape, for the benchmarks.
+
+A generated project has ``pages`` pages of ``lines`` lines each, written
+by the first commits of a develop chain ``chain`` commits long; the rest
+of the chain are small random edits merged one after another. Each of
+``users`` members then leaves ``locals_per_user`` local commits on top
+of the develop tip, every other one pushed. Everything is created through
+the same model methods the routes use, from a seeded RNG, so two runs
+with the same shape and seed build the same history.
+
+    DB_HOST=localhost python benchmarks/generator.py --pages 20 --chain 200
+
+Used on its own it builds a project and prints its id and hashes (and
+leaves it in place unless ``--drop`` is given).
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from db import get_connection
+from models.commit_model import Commit, CommitCreateForm
+from models.project_model import ProjectService
+from models.user_model import UserService
+
+
+class ProjectShape:
+    def __init__(self, pages: int = 10, lines: int = 100, chain: int = 50,
+                 users: int = 2, locals_per_user: int = 5):
+        if chain < pages:
+            raise ValueError("chain must be at least pages long: "
+                             "the first commits create the pages")
+        self.pages = pages
+        self.lines = lines
+        self.chain = chain
+        self.users = users
+        self.locals_per_user = locals_per_user
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+def add_shape_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--lines", type=int, default=100,
+                        help="lines per page")
+    parser.add_argument("--chain", type=int, default=50,
+                        help="develop commits, page creation included")
+    parser.add_argument("--users", type=int, default=2)
+    parser.add_argument("--locals-per-user", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def shape_from_args(args) -> ProjectShape:
+    return ProjectShape(args.pages, args.lines, args.chain,
+                        args.users, args.locals_per_user)
+
+
+class GeneratedProject:
+    def __init__(self, shape: ProjectShape, seed: int):
+        self.shape = shape
+        self.rng = random.Random(seed)
+        self.tag = f"bench-{uuid.uuid4().hex[:12]}"
+        self.users = []
+        self.project = None
+        self.develop_hashes = []
+        self.local_hashes = []
+        self.page_lines = {}
+
+    @property
+    def admin(self):
+        return self.users[0]
+
+    def line(self, page: int) -> str:
+        return f"line {self.rng.randrange(10 ** 6)} of page {page}"
+
+    def create(self, user, page: int, start: int, end: int,
+               lines) -> str:
+        form = CommitCreateForm(old_start=start, old_end=end, page=page,
+                                docs="\n".join(lines), title=self.tag,
+                                desc="")
+        commit = Commit(form, self.project, user)
+        return commit.create_commit()
+
+    def random_edit(self, page: int):
+        """``(start, end, lines)`` replacing up to three lines of ``page``
+        with up to three new ones, tracking the page's length."""
+        length = self.page_lines[page]
+        start = self.rng.randint(0, length)
+        end = min(length, start + self.rng.randint(0, 3))
+        lines = [self.line(page) for _ in range(self.rng.randint(1, 3))]
+        return start, end, lines
+
+    def merge(self, user, hash: str):
+        Commit.push_commit(hash, self.project, user)
+        Commit.merge_commit(hash, self.project)
+
+    def build(self) -> "GeneratedProject":
+        shape = self.shape
+        for index in range(max(1, shape.users)):
+            userid = f"{self.tag}-{index}"
+            UserService.create_user(userid, "bench", userid)
+            self.users.append(UserService.get_user(userid))
+        self.project = ProjectService.create_project(self.tag)
+        self.project.add_admin(self.admin._id)
+        for user in self.users[1:]:
+            self.project.add_user_role(user, "member")
+
+        for page in range(1, shape.pages + 1):
+            hash = self.create(self.admin, page, 0, 0,
+                               [self.line(page) for _ in range(shape.lines)])
+            self.merge(self.admin, hash)
+            self.page_lines[page] = shape.lines
+            self.develop_hashes.append(hash)
+        for _ in range(shape.chain - shape.pages):
+            page = self.rng.randint(1, shape.pages)
+            start, end, lines = self.random_edit(page)
+            hash = self.create(self.admin, page, start, end, lines)
+            self.merge(self.admin, hash)
+            self.page_lines[page] += len(lines) - (end - start)
+            self.develop_hashes.append(hash)
+
+        # Locals are based on the develop tip and don't change page
+        # lengths, so edits are drawn against the tip's lengths.
+        for user in self.users:
+            for index in range(shape.locals_per_user):
+                page = self.rng.randint(1, shape.pages)
+                hash = self.create(user, page, *self.random_edit(page))
+                if index % 2:
+                    Commit.push_commit(hash, self.project, user)
+                self.local_hashes.append(hash)
+
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("ANALYZE commits, commit_hunks, blocks, pages")
+            conn.commit()
+        finally:
+            conn.close()
+        return self
+
+    def drop(self):
+        if self.project is not None:
+            ProjectService.invalidate_pages(self.commit_ids())
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            if self.project is not None:
+                cur.execute("DELETE FROM projects WHERE id = %s",
+                            (self.project.project._id,))
+            cur.execute("DELETE FROM users WHERE userid LIKE %s",
+                        (f"{self.tag}-%",))
+            conn.commit()
+        finally:
+            conn.close()
+        UserService.invalidate_user()
+
+    def commit_ids(self):
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT id FROM commits WHERE project_id = %s",
+                        (self.project.project._id,))
+            return [row[0] for row in cur.fetchall()]
+        finally:
+            conn.close()
+
+    def summary(self):
+        return {
+            "project_id": self.project.project._id,
+            "shape": self.shape.to_dict(),
+            "users": [user.userid for user in self.users],
+            "develop_tip": self.develop_hashes[-1],
+            "local_hashes": self.local_hashes,
+        }
+
+
+def generate(shape: ProjectShape, seed: int = 0) -> GeneratedProject:
+    project = GeneratedProject(shape, seed)
+    try:
+        return project.build()
+    except BaseException:
+        project.drop()
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_shape_arguments(parser)
+    parser.add_argument("--drop", action="store_true",
+                        help="delete the project again after building it")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    project = generate(shape_from_args(args), args.seed)
+    summary = project.summary()
+    summary["build_seconds"] = round(time.perf_counter() - started, 2)
+    if args.drop:
+        project.drop()
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
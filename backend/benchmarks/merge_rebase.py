@@ -0,0 +1,172 @@
+"""Rebase cost of a merge against the number of open local commits.
+
+Creates a project with a few pages and ``--locals`` local commits spread
+over them, then times the rebase step of a merge: the in-memory
+``Commit._rebase_locals`` and, for comparison, the previous per-row DELETE
+/ UPDATE ... EXISTS / UPDATE statements. Every run happens in a
+rolled-back transaction, so each one sees the same commits. Needs a
+throwaway database reachable through the usual DB_* variables; the
+benchmark creates its own user and project and deletes them afterwards.
+
+    DB_HOST=localhost python benchmarks/merge_rebase.py --locals 100 500 1000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from db import get_connection
+from models.commit_model import Commit, CommitCreateForm
+from models.project_model import ProjectService
+from models.user_model import UserService
+
+PAGES = 5
+LINES = 200
+
+
+def old_rebase(commit: Commit, project: ProjectService, cur):
+    page, old_start, old_end, _, count = commit.hunks[0]
+    cur.execute(
+        """\
+            DELETE FROM commits c
+            WHERE c.project_id = %s
+              and c.mode = 'local'
+              and EXISTS (
+                SELECT 1 FROM commit_hunks h
+                WHERE h.commit_id = c.id
+                  and h.page_number = %s
+                  and ((h.start_block_index < %s and h.end_block_index > %s)
+                    or (h.start_block_index < %s and h.end_block_index > %s))
+              )
+        """,
+        (project.project._id, page, old_start, old_start, old_end, old_end)
+    )
+    shift = count - (old_end - old_start)
+    cur.execute(
+        """\
+            UPDATE commit_hunks h
+            SET start_block_index = h.start_block_index + %s,
+                end_block_index = h.end_block_index + %s
+            FROM commits c
+            WHERE c.id = h.commit_id
+              and c.project_id = %s
+              and c.mode = 'local'
+              and h.page_number = %s
+              and %s <= h.start_block_index
+        """,
+        (shift, shift, project.project._id, page, old_end)
+    )
+    cur.execute(
+        """\
+            UPDATE commits
+            SET parent_id = %s,
+                generation = %s,
+                max_page_number = GREATEST(max_page_number, %s)
+            WHERE project_id = %s
+              and mode = 'local'
+        """,
+        (commit._id, commit.generation + 1, commit.max_page,
+         project.project._id)
+    )
+
+
+def time_rebase(rebase, commit: Commit, project: ProjectService) -> float:
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """\
+                UPDATE commits SET status = 'merge', mode = 'develop'
+                WHERE id = %s
+            """,
+            (commit._id,)
+        )
+        started = time.perf_counter()
+        rebase(commit, project, cur)
+        elapsed = time.perf_counter() - started
+    finally:
+        conn.rollback()
+        conn.close()
+    return elapsed
+
+
+def analyze():
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("ANALYZE commits, commit_hunks, blocks")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def create(project, user, page, start, end, docs):
+    form = CommitCreateForm(old_start=start, old_end=end, page=page,
+                            docs=docs, title="bench", desc="")
+    commit = Commit(form, project, user)
+    commit.create_commit()
+    return commit.hash
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--locals", type=int, nargs="+",
+                        default=[100, 500, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    userid = f"bench-{uuid.uuid4().hex[:12]}"
+    UserService.create_user(userid, "bench", "bench")
+    user = UserService.get_user(userid)
+    project = ProjectService.create_project(f"bench {userid}")
+    results = []
+    try:
+        docs = "\n".join(f"line {i}" for i in range(LINES))
+        for page in range(1, PAGES + 1):
+            page_hash = create(project, user, page, 0, 0, docs)
+            Commit.push_commit(page_hash, project, user)
+            Commit.merge_commit(page_hash, project)
+        created = 0
+        for count in sorted(args.locals):
+            while created < count:
+                page = rng.randint(1, PAGES)
+                start = rng.randint(0, LINES - 1)
+                create(project, user, page, start,
+                       min(LINES, start + rng.randint(0, 3)), "edit")
+                created += 1
+            analyze()
+            merged = Commit.get_commit(
+                hash=create(project, user, 1, 10, 12, "merged\nlines\nhere"),
+                project=project)
+            new, old = [], []
+            for _ in range(args.repeat):
+                new.append(time_rebase(Commit._rebase_locals,
+                                       merged, project))
+                old.append(time_rebase(old_rebase, merged, project))
+            results.append({
+                "local_commits": count + 1,
+                "rebase_locals_ms": round(statistics.median(new) * 1000, 2),
+                "per_row_sql_ms": round(statistics.median(old) * 1000, 2),
+            })
+    finally:
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM projects WHERE id = %s",
+                        (project.project._id,))
+            cur.execute("DELETE FROM users WHERE userid = %s", (userid,))
+            conn.commit()
+        finally:
+            conn.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Size and latency of the page storage formats (PAGE_COMPRESSION).
+
+For each format (none, zlib, zstd when the zstandard package is
+installed) reports the stored size relative to the plain text and the
+median time to encode and decode a page with ``ProjectService``. Sizes
+for ``none`` are before PostgreSQL's own TOAST compression, which applies
+to text values over about 2 kB. With
+``--db`` it also times reading the stored columns back from a temporary
+table and decoding them, i.e. the cost of a page view that misses the
+page cache.
+
+Pages are synthetic markdown of the given sizes, or, with ``--from-db N``,
+a sample of N materialized pages from the database named by the usual
+DB_* variables.
+
+    python benchmarks/page_compression.py --sizes 1000 10000 100000
+    DB_HOST=localhost python benchmarks/page_compression.py --from-db 200 --db
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument("--sizes", type=int, nargs="+",
+                    default=[1_000, 10_000, 100_000],
+                    help="synthetic page sizes in characters")
+parser.add_argument("--from-db", type=int, metavar="N",
+                    help="sample N stored pages instead of synthetic ones")
+parser.add_argument("--level", type=int, default=3)
+parser.add_argument("--repeat", type=int, default=20)
+parser.add_argument("--db", action="store_true",
+                    help="also time reads of the stored columns")
+args = parser.parse_args()
+
+os.environ["PAGE_COMPRESSION_LEVEL"] = str(args.level)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from db import get_connection
+from models.project_model import PAGE_FORMATS, ProjectService, zstandard
+
+WORDS = ("문서 페이지 변경 커밋 프로젝트 release develop local merge push "
+         "the a of to and in is for block index title note").split()
+
+
+def synthetic_page(size: int, rng: random.Random) -> str:
+    lines = []
+    length = 0
+    while length < size:
+        if rng.random() < 0.1:
+            line = "## " + " ".join(rng.choices(WORDS, k=4))
+        elif rng.random() < 0.2:
+            line = "- " + " ".join(rng.choices(WORDS, k=rng.randint(3, 10)))
+        else:
+            line = " ".join(rng.choices(WORDS, k=rng.randint(5, 20)))
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines)[:size]
+
+
+def sample_pages(count: int):
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """\
+            SELECT content, content_blob, content_format FROM pages
+            ORDER BY random()
+            LIMIT %s
+            """,
+            (count,)
+        )
+        return [ProjectService.decode_page(*row) for row in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+def median_ms(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return round(statistics.median(timings) * 1000, 4)
+
+
+def read_ms(stored, repeat: int) -> float:
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """\
+            CREATE TEMP TABLE bench_pages (
+                id INTEGER PRIMARY KEY,
+                content TEXT,
+                content_blob BYTEA,
+                content_format SMALLINT NOT NULL
+            )
+            """
+        )
+        cur.execute("ALTER TABLE bench_pages "
+                    "ALTER COLUMN content_blob SET STORAGE EXTERNAL")
+        for index, columns in enumerate(stored):
+            cur.execute("INSERT INTO bench_pages VALUES (%s, %s, %s, %s)",
+                        (index, *columns))
+
+        def read_all():
+            for index in range(len(stored)):
+                cur.execute(
+                    """\
+                    SELECT content, content_blob, content_format
+                    FROM bench_pages WHERE id = %s
+                    """,
+                    (index,)
+                )
+                ProjectService.decode_page(*cur.fetchone())
+
+        return round(median_ms(read_all, repeat) / len(stored), 4)
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def measure(label: str, pages):
+    raw_bytes = sum(len(page.encode()) for page in pages)
+    results = []
+    for name, page_format in PAGE_FORMATS.items():
+        if name == "zstd" and zstandard is None:
+            continue
+        stored = [ProjectService.encode_page(page, page_format)
+                  for page in pages]
+        stored_bytes = sum(len(content.encode()) if blob is None
+                           else len(blob)
+                           for content, blob, _ in stored)
+        result = {
+            "pages": label,
+            "format": name,
+            "raw_bytes": raw_bytes,
+            "stored_bytes": stored_bytes,
+            "ratio": round(raw_bytes / stored_bytes, 2),
+            "encode_ms_per_page": round(median_ms(
+                lambda: [ProjectService.encode_page(page, page_format)
+                         for page in pages], args.repeat) / len(pages), 4),
+            "decode_ms_per_page": round(median_ms(
+                lambda: [ProjectService.decode_page(*columns)
+                         for columns in stored], args.repeat) / len(pages), 4),
+        }
+        if args.db:
+            result["read_ms_per_page"] = read_ms(stored, args.repeat)
+        results.append(result)
+    return results
+
+
+def main():
+    results = []
+    if args.from_db:
+        pages = sample_pages(args.from_db)
+        if pages:
+            results += measure(f"{len(pages)} stored", pages)
+    else:
+        rng = random.Random(0)
+        for size in args.sizes:
+            pages = [synthetic_page(size, rng) for _ in range(10)]
+            results += measure(f"{size} chars", pages)
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
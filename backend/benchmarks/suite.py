@@ -0,0 +1,254 @@
+"""Backend benchmark suite over a generated project.
+
+Builds a project with ``generator.py`` and times the model methods behind
+the hot routes:
+
+    page_read_cold          get_page with the page neither cached nor
+                            materialized at the develop tip, so it is
+                            replayed (in a rolled-back transaction, so
+                            every run replays the same history)
+    page_read_materialized  get_page served from ``pages``, page cache empty
+    page_read_cached        get_page served from the page cache
+    search_chain            develop history from the tip (search_with_chain)
+    search_chain_deep       the same, ``--search-offset`` commits down
+    search_no_chain         pushed commits (search_without_chain)
+    commit_create           a one-page edit on the develop tip
+    commit_push             pushing it
+    commit_merge            merging it, rebasing the open local commits
+    commit_promote          promoting develop to release
+
+Read and search scenarios run before the write scenarios, which move the
+develop tip on. Results go to stdout, or to ``--output``, as JSON:
+median/p95/min/max milliseconds per scenario plus the shape, seed,
+settings and git revision of the run, so two runs can be put side by side
+with ``compare.py``. Needs a throwaway database reachable through the
+usual DB_* variables; the project and its users are deleted afterwards
+unless ``--keep`` is given.
+
+    DB_HOST=localhost python benchmarks/suite.py --pages 20 --chain 300 \\
+        --output before.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import config
+from db import get_connection
+from models.commit_model import Commit
+from models.project_model import ProjectService
+
+from generator import add_shape_arguments, generate, shape_from_args
+
+READ_SCENARIOS = ["page_read_cold", "page_read_materialized",
+                  "page_read_cached", "search_chain", "search_chain_deep",
+                  "search_no_chain"]
+WRITE_SCENARIOS = ["commit_create", "commit_push", "commit_merge",
+                   "commit_promote"]
+SCENARIOS = READ_SCENARIOS + WRITE_SCENARIOS
+
+
+def summarize(seconds):
+    ordered = sorted(seconds)
+    return {
+        "runs": len(ordered),
+        "median_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[max(0, -(-len(ordered) * 95 // 100) - 1)]
+                        * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def timed(func, *args, **kwargs) -> float:
+    started = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - started
+
+
+def develop_tip(generated) -> Commit:
+    return Commit.get_commit(mode="develop", project=generated.project)
+
+
+def page_read_cold(generated, repeat):
+    project, tip = generated.project, develop_tip(generated)
+    samples = []
+    for _ in range(repeat):
+        for page in range(1, tip.max_page + 1):
+            conn = get_connection()
+            try:
+                cur = conn.cursor()
+                cur.execute(
+                    """\
+                        DELETE FROM pages
+                        WHERE commit_id = %s and page_number = %s
+                    """,
+                    (tip._id, page)
+                )
+                ProjectService.page_cache.clear()
+                samples.append(timed(project.get_page, page=page,
+                                     commit=tip, cursor=cur))
+            finally:
+                conn.rollback()
+                conn.close()
+    ProjectService.page_cache.clear()
+    return samples
+
+
+def page_read_materialized(generated, repeat):
+    project, tip = generated.project, develop_tip(generated)
+    for page in range(1, tip.max_page + 1):
+        project.get_page(page=page, commit=tip)
+    samples = []
+    for _ in range(repeat):
+        for page in range(1, tip.max_page + 1):
+            ProjectService.page_cache.clear()
+            samples.append(timed(project.get_page, page=page, commit=tip))
+    return samples
+
+
+def page_read_cached(generated, repeat):
+    project, tip = generated.project, develop_tip(generated)
+    for page in range(1, tip.max_page + 1):
+        project.get_page(page=page, commit=tip)
+    return [timed(project.get_page, page=page, commit=tip)
+            for _ in range(repeat)
+            for page in range(1, tip.max_page + 1)]
+
+
+def search_chain(generated, repeat, offset=0):
+    return [timed(Commit.search_with_chain, generated.project, None,
+                  "develop", offset, offset + 10)
+            for _ in range(repeat)]
+
+
+def search_chain_deep(generated, repeat, offset):
+    return search_chain(generated, repeat, offset)
+
+
+def search_no_chain(generated, repeat):
+    return [timed(Commit.search_without_chain, generated.project, None,
+                  "push", None, None, None, None, 0, 10)
+            for _ in range(repeat)]
+
+
+def run_writes(generated, repeat, scenarios):
+    samples = {name: [] for name in WRITE_SCENARIOS}
+    admin = generated.admin
+    for _ in range(repeat):
+        page = generated.rng.randint(1, generated.shape.pages)
+        start, end, lines = generated.random_edit(page)
+        started = time.perf_counter()
+        hash = generated.create(admin, page, start, end, lines)
+        samples["commit_create"].append(time.perf_counter() - started)
+        samples["commit_push"].append(
+            timed(Commit.push_commit, hash, generated.project, admin))
+        samples["commit_merge"].append(
+            timed(Commit.merge_commit, hash, generated.project))
+        generated.page_lines[page] += len(lines) - (end - start)
+        if "commit_promote" in scenarios:
+            samples["commit_promote"].append(
+                timed(Commit.promote_commit, generated.project))
+    return {name: values for name, values in samples.items()
+            if name in scenarios}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def server_version():
+    conn = get_connection()
+    try:
+        return conn.server_version
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_shape_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="runs per scenario (page reads: per page)")
+    parser.add_argument("--search-offset", type=int, default=None,
+                        help="start of search_chain_deep; half the chain "
+                             "by default")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS,
+                        default=SCENARIOS)
+    parser.add_argument("--output", help="write the JSON here")
+    parser.add_argument("--keep", action="store_true",
+                        help="leave the generated project in the database")
+    args = parser.parse_args()
+
+    shape = shape_from_args(args)
+    offset = args.search_offset
+    if offset == None:
+        offset = shape.chain // 2
+
+    started = time.perf_counter()
+    generated = generate(shape, args.seed)
+    build_seconds = time.perf_counter() - started
+    results = {}
+    try:
+        for name in READ_SCENARIOS:
+            if name not in args.scenarios:
+                continue
+            if name == "search_chain_deep":
+                samples = search_chain_deep(generated, args.repeat, offset)
+            else:
+                samples = globals()[name](generated, args.repeat)
+            results[name] = summarize(samples)
+        writes = [name for name in args.scenarios if name in WRITE_SCENARIOS]
+        if writes:
+            for name, samples in run_writes(generated, args.repeat,
+                                            writes).items():
+                results[name] = summarize(samples)
+    finally:
+        if not args.keep:
+            generated.drop()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc)
+                                 .isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "postgres": server_version(),
+            "settings": {
+                "PAGE_CACHE_BYTES": config.PAGE_CACHE_BYTES,
+                "PAGE_CHECKPOINT_INTERVAL": config.PAGE_CHECKPOINT_INTERVAL,
+                "PAGE_COMPRESSION": config.PAGE_COMPRESSION,
+                "DB_POOL_MAX": config.DB_POOL_MAX,
+            },
+        },
+        "shape": shape.to_dict(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "search_offset": offset,
+        "build_seconds": round(build_seconds, 2),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -129,35 +129,19 @@ export default function Project() {
 
   const fetchProjectPages = async (projId: number) => {
     try {
-      // 1. 먼저 max_page 계산
-      const commitRes = await axios.get(`${API_BASE}/api/commit/${projId}/search`, {
-        params: { mode: "develop", start: 0, end: 50 },
+      // 전체 페이지를 한 번의 요청으로 불러온다
+      const res = await axios.get(`${API_BASE}/api/project/${projId}/pages`, {
+        params: { mode: "release" },
         withCredentials: true,
       });
 
-      const maxPage = Math.max(...commitRes.data.map((c: any) => c.max_page || 1));
-
-      // 2. 각 페이지를 순회하며 요청
-      const pages: string[] = [];
-      for (let i = 1; i <= maxPage; i++) {
-        try {
-          const res = await axios.get(`${API_BASE}/api/project/${projId}`, {
-            params: {
-              mode: "release",
-              page: i,
-            },
-            withCredentials: true,
-          });
-          pages.push(res.data?.docs || `# Page ${i}\n\n(내용 없음)`);
-        } catch (err: any) {
-          console.error(`[ERROR] ${i}페이지 불러오기 실패`, err);
-          pages.push(`# Page ${i}\n\n(에러 발생)`);
-        }
-      }
+      const pages: string[] = res.data.map(
+        (p: any) => p.docs || `# Page ${p.page}\n\n(내용 없음)`
+      );
 
       setMarkdownPages(pages);
     } catch (err) {
-      console.error("[ERROR] 최대 페이지 수 계산 실패:", err);
+      console.error("[ERROR] 페이지 불러오기 실패:", err);
       setMarkdownPages([]);
     }
   };
@@ -27,6 +27,18 @@ GRANT SELECT, INSERT, UPDATE, DELETE ON TABLES TO app;
 ALTER DEFAULT PRIVILEGES FOR ROLE dev IN SCHEMA public
 GRANT USAGE, SELECT, UPDATE ON SEQUENCES TO app;
 
+-- pg_trgm backs the trigram index on commits.title. Creating an extension
+-- needs CREATE on the database, which dev doesn't have, so it is done here
+-- before switching to dev. Skipped where contrib isn't installed.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'
+    ) THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    END IF;
+END $$;
+
 SET SESSION AUTHORIZATION dev;
 
 
@@ -54,6 +66,9 @@ CREATE TABLE "users" (
     "description" TEXT
 );
 
+-- Keyset pagination of user search
+CREATE INDEX "users_name_idx" ON "users" ("name", "id");
+
 -- Projects table: stores project metadata
 -- Columns:
 --   id           : Unique project identifier
@@ -68,6 +83,9 @@ CREATE TABLE "projects" (
     "description" TEXT
 );
 
+-- Keyset pagination of project search
+CREATE INDEX "projects_name_idx" ON "projects" ("name", "id");
+
 -- Enum for user authorization roles in a project
 -- 'viewer': Can only read project content (no write/commit access)
 -- 'member': Can read and write, create commits, but not merge
@@ -119,6 +137,9 @@ CREATE TYPE commit_status AS ENUM ('normal', 'push', 'merge');
 --   description     : Detailed message describing changes
 --   status          : Enum (default/push/merge) describing commit role/state
 --   mode            : Enum (release/develop/local) indicating context for this commit
+--   generation      : Distance from the project's first commit (parent's + 1).
+--                     Release and develop commits form one line, so their
+--                     ancestors are exactly the line commits of lower generation
 CREATE TABLE "commits" (
     "id" SERIAL PRIMARY KEY,
     "commit_sha256" CHAR(64) NOT NULL,
@@ -131,46 +152,135 @@ CREATE TABLE "commits" (
     "status" commit_status NOT NULL DEFAULT 'normal',
     "mode" project_mode NOT NULL DEFAULT 'local',
     "max_page_number" INTEGER NOT NULL,
-    "start_block_index" INTEGER NOT NULL,
-    "end_block_index" INTEGER Not NULL,
+    "generation" INTEGER NOT NULL DEFAULT 0,
 
     FOREIGN KEY ("project_id") REFERENCES "projects"("id") ON DELETE CASCADE,
     FOREIGN KEY ("user_id") REFERENCES "users"("id") ON DELETE CASCADE,
     FOREIGN KEY ("parent_id") REFERENCES "commits"("id") ON DELETE SET NULL
 );
 
+-- Hash lookups, tip discovery over children, and per-project mode scans
+CREATE INDEX "commits_project_sha256_idx" ON "commits" ("project_id", "commit_sha256");
+CREATE INDEX "commits_parent_mode_idx" ON "commits" ("parent_id", "mode");
+CREATE INDEX "commits_project_mode_idx" ON "commits" ("project_id", "mode");
+-- Keyset pagination of commit search (newest first)
+CREATE INDEX "commits_project_date_idx" ON "commits" ("project_id", "date", "id");
+-- History walks: ancestors of a commit as a range scan over the line.
+-- Unique, since ancestry by generation needs one line commit per generation
+CREATE UNIQUE INDEX "commits_line_generation_key" ON "commits" ("project_id", "generation")
+    WHERE "mode" <> 'local';
+
+-- Mode heads table: current tip of each linear timeline in a project
+-- Columns:
+--   project_id : The project the timeline belongs to
+--   mode       : 'develop' (tip of develop and release commits)
+--                or 'release' (tip of release commits only)
+--   commit_id  : The tip commit, moved by merge (develop) and promote (release)
+CREATE TABLE "mode_heads" (
+    "project_id" INTEGER NOT NULL,
+    "mode" project_mode NOT NULL,
+    "commit_id" INTEGER NOT NULL,
+
+    PRIMARY KEY ("project_id", "mode"),
+    FOREIGN KEY ("project_id") REFERENCES "projects"("id") ON DELETE CASCADE,
+    FOREIGN KEY ("commit_id") REFERENCES "commits"("id") ON DELETE CASCADE
+);
+
+-- Commit hunks table: the edits a commit makes, one row per edit
+-- Columns:
+--   commit_id         : The commit making the edit
+--   hunk_index        : Order of the edit within the commit, by page and start
+--   page_number       : The page the edit applies to
+--   start_block_index : First block of the parent's page replaced by the edit
+--   end_block_index   : Block after the last one replaced (start = end inserts)
+--   block_offset      : First of the commit's blocks (by block_index) written
+--   block_count       : Number of the commit's blocks written
+-- Hunks of a commit never overlap; local commits' ranges are shifted
+-- whenever another commit is merged.
+CREATE TABLE "commit_hunks" (
+    "commit_id" INTEGER NOT NULL,
+    "hunk_index" INTEGER NOT NULL,
+    "page_number" INTEGER NOT NULL,
+    "start_block_index" INTEGER NOT NULL,
+    "end_block_index" INTEGER NOT NULL,
+    "block_offset" INTEGER NOT NULL,
+    "block_count" INTEGER NOT NULL,
+
+    PRIMARY KEY ("commit_id", "hunk_index"),
+    FOREIGN KEY ("commit_id") REFERENCES "commits"("id") ON DELETE CASCADE
+);
+
+-- Block contents table: the text of every distinct block, stored once
+-- Columns:
+--   hash    : sha256 of the UTF-8 encoded content
+--   content : The actual text or content of the block
+CREATE TABLE "block_contents" (
+    "hash" BYTEA PRIMARY KEY,
+    "content" TEXT NOT NULL
+);
+
 -- Blocks table: content blocks grouped by page and index
 -- Columns:
 --   project_id        : The project this block belongs to
 --   page_number       : Which page the block appears on
 --   block_index       : Order of the block within the page
---   content           : The actual text or content of the block
+--   content_hash      : The text of the block, in block_contents
 --   commit_id         : Reference to the commit operation that created or modified this block
 -- Each block is linked to a commit_id entry
 CREATE TABLE "blocks" (
     "project_id" INTEGER NOT NULL,
     "page_number" INTEGER NOT NULL,
     "block_index" INTEGER NOT NULL,
-    "content" TEXT NOT NULL,
+    "content_hash" BYTEA NOT NULL,
     "commit_id" INTEGER NOT NULL,
 
+    PRIMARY KEY ("commit_id", "block_index"),
     FOREIGN KEY ("project_id") REFERENCES "projects"("id") ON DELETE CASCADE,
-    FOREIGN KEY ("commit_id") REFERENCES "commits"("id") ON DELETE CASCADE
+    FOREIGN KEY ("commit_id") REFERENCES "commits"("id") ON DELETE CASCADE,
+    FOREIGN KEY ("content_hash") REFERENCES "block_contents"("hash")
 );
 
+CREATE INDEX "blocks_content_hash_idx" ON "blocks" ("content_hash");
+
 -- Pages table: content pages grouped by page
 -- Columns:
 --   project_id        : The project this block belongs to
 --   page_number       : Which page the block appears on
 --   content           : The actual text or content of the block
 --   commit_id : Reference to the commit operation that created or modified this block
+--   content_blob      : Compressed page text, when content_format is not 0
+--   content_format    : 0 = plain text in content, 1 = zlib, 2 = zstd
+--   search_vector     : to_tsvector('simple', <page text>), written with the row
 -- Each block is linked to a commit_content entry
 CREATE TABLE "pages" (
     "project_id" INTEGER NOT NULL,
-    "content" TEXT NOT NULL,
+    "content" TEXT,
     "page_number" INTEGER NOT NULL,
     "commit_id" INTEGER NOT NULL,
+    "search_vector" TSVECTOR,
+    "content_blob" BYTEA,
+    "content_format" SMALLINT NOT NULL DEFAULT 0,
 
+    PRIMARY KEY ("commit_id", "page_number"),
+    CONSTRAINT "pages_content_check"
+    CHECK (("content_format" = 0) = ("content" IS NOT NULL)
+           and ("content_format" = 0) = ("content_blob" IS NULL)),
     FOREIGN KEY ("project_id") REFERENCES "projects"("id") ON DELETE CASCADE,
     FOREIGN KEY ("commit_id") REFERENCES "commits"("id") ON DELETE CASCADE
-)
\ No newline at end of file
+);
+
+-- Compressed pages are already compressed; don't let TOAST try again
+ALTER TABLE "pages" ALTER COLUMN "content_blob" SET STORAGE EXTERNAL;
+
+-- Full-text search over materialized page content
+CREATE INDEX "pages_search_vector_idx" ON "pages" USING gin ("search_vector");
+
+-- Trigram indexes for the title and title/description LIKE '%...%'
+-- filters of commit search, if pg_trgm was created above.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        CREATE INDEX "commits_title_trgm_idx" ON "commits" USING gin ("title" gin_trgm_ops);
+        CREATE INDEX "commits_description_trgm_idx" ON "commits" USING gin ("description" gin_trgm_ops);
+    END IF;
+END $$;
\ No newline at end of file